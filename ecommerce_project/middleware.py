@@ -1,4 +1,7 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
 from django.middleware.common import CommonMiddleware
+from ml.metrics import collect_timings
 
 class CustomCommonMiddleware(CommonMiddleware):
     def process_response(self, request, response):
@@ -8,4 +11,43 @@ class CustomCommonMiddleware(CommonMiddleware):
             response['X-Content-Type-Options'] = 'nosniff'
             response['X-Frame-Options'] = 'SAMEORIGIN'
             response['X-XSS-Protection'] = '1; mode=block'
-        return response 
\ No newline at end of file
+        return response 
+
+class ServerTimingMiddleware:
+    """Report the recommendation pipeline stages run by a request in a Server-Timing header.
+
+    Only active when ML_SERVER_TIMING is enabled, since the header reveals
+    internal timings to clients.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, 'ML_SERVER_TIMING', False)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.enabled:
+            return self.get_response(request)
+        with collect_timings() as timings:
+            response = self.get_response(request)
+        return self.add_header(response, timings)
+
+    async def __acall__(self, request):
+        if not self.enabled:
+            return await self.get_response(request)
+        with collect_timings() as timings:
+            response = await self.get_response(request)
+        return self.add_header(response, timings)
+
+    @staticmethod
+    def add_header(response, timings):
+        if timings:
+            response['Server-Timing'] = ', '.join(
+                f'{stage};dur={seconds * 1000:.3f}' for stage, seconds in timings.items()
+            )
+        return response
@@ -38,6 +38,7 @@ MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'ecommerce_project.middleware.CustomCommonMiddleware',
+    'ecommerce_project.middleware.ServerTimingMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
@@ -79,6 +80,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'ecommerce_project.wsgi.application'
+ASGI_APPLICATION = 'ecommerce_project.asgi.application'
 
 DATABASES = {
     'default': {
@@ -138,4 +140,64 @@ LOGIN_URL = 'login'
 ML_DATA_DIR = os.path.join(BASE_DIR, 'data')
 ML_CUSTOMER_DATA = os.path.join(ML_DATA_DIR, 'customer_data_collection.csv')
 ML_PRODUCT_DATA = os.path.join(ML_DATA_DIR, 'products_recommandation_data.csv')
-ML_DB_PATH = os.path.join(ML_DATA_DIR, 'feedback.db') 
\ No newline at end of file
+ML_DB_PATH = os.path.join(ML_DATA_DIR, 'feedback.db') 
+
+# Popularity counters are buffered in memory and written in batches
+ML_POPULARITY_FLUSH_INTERVAL = float(os.environ.get('ML_POPULARITY_FLUSH_INTERVAL', 2.0))
+ML_POPULARITY_FLUSH_SIZE = int(os.environ.get('ML_POPULARITY_FLUSH_SIZE', 500))
+ML_POPULARITY_RESYNC_INTERVAL = float(os.environ.get('ML_POPULARITY_RESYNC_INTERVAL', 30.0))
+
+# Item-item neighbour index built by the build_similarity_index command
+RECOMMENDER_INDEX_DIR = os.environ.get('RECOMMENDER_INDEX_DIR', os.path.join(ML_DATA_DIR, 'similarity_index'))
+RECOMMENDER_NEIGHBORS_K = int(os.environ.get('RECOMMENDER_NEIGHBORS_K', 50))
+RECOMMENDER_INDEX_CHECK_INTERVAL = float(os.environ.get('RECOMMENDER_INDEX_CHECK_INTERVAL', 60.0))
+RECOMMENDER_CONTENT_MODEL_PATH = os.environ.get('RECOMMENDER_CONTENT_MODEL_PATH', os.path.join(ML_DATA_DIR, 'content_model.pkl'))
+
+# Per-customer recommendation cache, holding at most ML_RECOMMENDATION_CACHE_SIZE
+# lists in all; set ML_RECOMMENDATION_CACHE_BACKEND to a CACHES alias to share it between workers instead of keeping it in memory.
+# Clicks invalidate the cache of the worker that served them and of the one
+# consuming the click log; other workers only see the invalidation through a
+# shared backend, and otherwise serve their cached list until the TTL expires
+ML_RECOMMENDATION_CACHE_SIZE = int(os.environ.get('ML_RECOMMENDATION_CACHE_SIZE', 10000))
+ML_RECOMMENDATION_CACHE_TTL = float(os.environ.get('ML_RECOMMENDATION_CACHE_TTL', 60.0))
+ML_RECOMMENDATION_CACHE_BACKEND = os.environ.get('ML_RECOMMENDATION_CACHE_BACKEND') or None
+
+# Batch scoring: memory the score buffers of one chunk of customers may take,
+# and the most customers per batch request
+ML_SCORING_MEMORY_BUDGET_MB = int(os.environ.get('ML_SCORING_MEMORY_BUDGET_MB', 64))
+ML_BATCH_MAX_CUSTOMERS = int(os.environ.get('ML_BATCH_MAX_CUSTOMERS', 1000))
+# Bearer token callers of /ml/recommend/batch/ must send; the endpoint is disabled without one
+ML_BATCH_API_TOKEN = os.environ.get('ML_BATCH_API_TOKEN') or None
+
+# Pagination of /recommend and /search: the largest page, how many results
+# are ranked for a session's pages, and how many of those rankings are kept and for how long
+ML_MAX_TOP_N = int(os.environ.get('ML_MAX_TOP_N', 100))
+ML_RANKED_CANDIDATES = int(os.environ.get('ML_RANKED_CANDIDATES', 200))
+ML_RANKED_PAGES_SIZE = int(os.environ.get('ML_RANKED_PAGES_SIZE', 1000))
+ML_RANKED_PAGES_TTL = float(os.environ.get('ML_RANKED_PAGES_TTL', 300.0))
+
+# Async ML views: threads running scoring and SQLite reads, and the most
+# feedback writes waiting to be applied before views apply them inline
+ML_WORKER_THREADS = int(os.environ.get('ML_WORKER_THREADS', 4))
+ML_FEEDBACK_QUEUE_SIZE = int(os.environ.get('ML_FEEDBACK_QUEUE_SIZE', 10000))
+
+# Clicks are appended to user_interactions and folded into preferences and
+# popularity by a background consumer, in batches of at most this many
+ML_CLICK_BATCH_SIZE = int(os.environ.get('ML_CLICK_BATCH_SIZE', 1000))
+ML_CLICK_CONSUME_INTERVAL = float(os.environ.get('ML_CLICK_CONSUME_INTERVAL', 0.5))
+
+# Add a Server-Timing header with the recommendation pipeline stages of each request
+ML_SERVER_TIMING = os.environ.get('ML_SERVER_TIMING', 'False') == 'True'
+
+# Precomputed rows written by precompute_recommendations older than this are ignored
+RECOMMENDER_PRECOMPUTED_MAX_AGE = int(os.environ.get('RECOMMENDER_PRECOMPUTED_MAX_AGE', 24 * 60 * 60))
+
+# Memory-mapped catalog snapshot built by the build_ml_snapshot command
+ML_SNAPSHOT_DIR = os.environ.get('ML_SNAPSHOT_DIR', os.path.join(ML_DATA_DIR, 'ml_snapshot'))
+
+# Workers reload the ML catalog when a new snapshot or CSV file appears, or on the signal
+ML_RELOAD_CHECK_INTERVAL = float(os.environ.get('ML_RELOAD_CHECK_INTERVAL', 60.0))
+ML_RELOAD_SIGNAL = os.environ.get('ML_RELOAD_SIGNAL', 'SIGUSR2')
+
+# Number of analyzed search queries cached per process
+ML_QUERY_CACHE_SIZE = int(os.environ.get('ML_QUERY_CACHE_SIZE', 4096))
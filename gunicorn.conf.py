@@ -0,0 +1,18 @@
+# Gunicorn settings, read automatically from the working directory.
+# The app is preloaded in the master so the ML catalog is loaded once and
+# shared copy-on-write by every worker.
+preload_app = True
+
+
+def pre_fork(server, worker):
+    from ml.app import prepare_fork
+    prepare_fork()
+
+
+def post_worker_init(worker):
+    # Gunicorn resets the worker's signal handlers after post_fork, so
+    # install ours once the worker is initialized. Send ML_RELOAD_SIGNAL to
+    # the workers (not the master, which uses SIGUSR2 to upgrade itself)
+    # to reload the catalog.
+    from ml.app import install_reload_signal
+    install_reload_signal()
@@ -1,65 +1,230 @@
+import gc
 import os
+import signal
+import sqlite3
+import threading
+import time
 import pandas as pd
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
-from sklearn.preprocessing import StandardScaler, MinMaxScaler
-from sklearn.feature_extraction.text import TfidfVectorizer
-import sqlite3
+from sklearn.preprocessing import MinMaxScaler
 from django.conf import settings
+from django.core.cache import caches
+from .cache import RankedPages, RecommendationCache, make_cursor, parse_cursor
+from .customers import CustomerStore
+from .db import close_connections, get_connection
+from .ingest import LogConsumer
+from .metrics import metrics
+from .popularity import PopularityCounters
+from .search import SearchIndex
+from .snapshot import current_version, load_snapshot, source_stamp
+from .store import ProductStore, Ranking
+from .writebehind import PopularityBuffer
 
 # File paths from Django settings
 CUSTOMER_DATA_FILE = settings.ML_CUSTOMER_DATA
 PRODUCT_DATA_FILE = settings.ML_PRODUCT_DATA
 DB_PATH = settings.ML_DB_PATH
+SNAPSHOT_DIR = getattr(settings, 'ML_SNAPSHOT_DIR', None)
 
 # Global variables
-customer_df = None
-product_df = None
-tfidf = None
-tfidf_matrix = None
+customer_store = None
 features = None
-scaler = None
+store = None
+popularity_counters = None
+search_index = None
+# Version of the files the loaded catalog came from, see data_version()
+loaded_version = None
 
-def init_data():
-    global customer_df, product_df, tfidf, tfidf_matrix, features, scaler
-    
+# Seconds between checks for a new snapshot or changed CSV files; 0 disables them
+RELOAD_CHECK_INTERVAL = getattr(settings, 'ML_RELOAD_CHECK_INTERVAL', 60.0)
+# Signal that makes a worker reload the catalog
+RELOAD_SIGNAL = getattr(settings, 'ML_RELOAD_SIGNAL', 'SIGUSR2')
+reload_requested = False
+last_reload_check = time.monotonic()
+reload_lock = threading.Lock()
+
+# Each customer's ranking of the best RANKED_CANDIDATES products, dropped when they click
+CACHE_BACKEND = getattr(settings, 'ML_RECOMMENDATION_CACHE_BACKEND', None)
+recommendation_cache = RecommendationCache(
+    max_entries=getattr(settings, 'ML_RECOMMENDATION_CACHE_SIZE', 10000),
+    ttl=getattr(settings, 'ML_RECOMMENDATION_CACHE_TTL', 60.0),
+    backend=caches[CACHE_BACKEND] if CACHE_BACKEND else None
+)
+
+# Results ranked up front for cursor pagination, and the rankings kept for
+# the following pages of each session
+RANKED_CANDIDATES = getattr(settings, 'ML_RANKED_CANDIDATES', 200)
+ranked_pages = RankedPages(
+    max_entries=getattr(settings, 'ML_RANKED_PAGES_SIZE', 1000),
+    ttl=getattr(settings, 'ML_RANKED_PAGES_TTL', 300.0),
+    backend=caches[CACHE_BACKEND] if CACHE_BACKEND else None
+)
+
+# Features for recommendation
+FEATURES = [
+    'Product_Rating',
+    'Customer_Review_Sentiment_Score',
+    'Probability_of_Recommendation'
+]
+
+# Name of the click consumer's row in ingest_offsets
+CLICK_LOG = 'clicks'
+
+# Memory the scoring buffers of one chunk of customers may take, and
+# customer IDs bound per SQL query
+SCORING_MEMORY_BUDGET = getattr(settings, 'ML_SCORING_MEMORY_BUDGET_MB', 64) * 1024 * 1024
+SQL_CHUNK_SIZE = 500
+
+# Scratch bytes per customer x product score: the float32 similarity, final
+# score and negated score argpartition sorts, and its int64 positions
+SCORE_BYTES = 4 + 4 + 4 + 8
+
+# Number of analyzed search queries kept per process
+QUERY_CACHE_SIZE = getattr(settings, 'ML_QUERY_CACHE_SIZE', 4096)
+
+# Weights of the normalized product features in the final recommendation score
+QUALITY_WEIGHTS = np.array([0.2, 0.2, 0.2])
+
+def source_files():
+    """Return the stamp of the CSV files the catalog is built from"""
+    return source_stamp([CUSTOMER_DATA_FILE, PRODUCT_DATA_FILE])
+
+def build_data():
+    """Parse the CSV files into a (product store, customer store) pair"""
     # Load data
-    customer_df = pd.read_csv(CUSTOMER_DATA_FILE)
-    product_df = pd.read_csv(PRODUCT_DATA_FILE)
-    
-    # Features for recommendation
-    features = [
-        'Product_Rating',
-        'Customer_Review_Sentiment_Score',
-        'Probability_of_Recommendation'
-    ]
+    new_customer_df = pd.read_csv(CUSTOMER_DATA_FILE)
+    new_product_df = pd.read_csv(PRODUCT_DATA_FILE)
     
     # Normalize features
     scaler = MinMaxScaler()
-    product_df[features] = scaler.fit_transform(product_df[features])
+    new_product_df[FEATURES] = scaler.fit_transform(new_product_df[FEATURES])
     
-    # Create text representation for search
-    product_df['text'] = (
-        product_df['Brand'].fillna('') + ' ' +
-        product_df['Category'].fillna('') + ' ' +
-        product_df['Subcategory'].fillna('')
-    )
+    new_store = ProductStore.from_frame(new_product_df, FEATURES, QUALITY_WEIGHTS)
+    return new_store, CustomerStore.from_frame(new_customer_df, new_store)
+
+def data_version():
+    """Identify the catalog files init_data() would load right now"""
+    snapshot = current_version(SNAPSHOT_DIR) if SNAPSHOT_DIR else None
+    return snapshot, source_files()
+
+def init_data():
+    global customer_store, features, store, popularity_counters, search_index, loaded_version
     
-    # Initialize TF-IDF vectorizer for search
-    tfidf = TfidfVectorizer(stop_words='english')
-    tfidf_matrix = tfidf.fit_transform(product_df['text'])
+    version = data_version()
+    
+    # Map the prebuilt snapshot when it matches the CSV files, so workers
+    # share its pages instead of each parsing and refitting the catalog
+    snapshot = None
+    if SNAPSHOT_DIR:
+        snapshot = load_snapshot(SNAPSHOT_DIR, source_files())
+    if snapshot is not None:
+        new_store, new_customer_store, _ = snapshot
+    else:
+        new_store, new_customer_store = build_data()
+    
+    # Seed the resident popularity counters for the new product index
+    new_counters = PopularityCounters(new_store.product_index)
+    new_counters.load(_read_popularity())
+    
+    # Publish everything at once so requests never see a half-built catalog
+    customer_store, features = new_customer_store, new_store.features
+    store = new_store
+    popularity_counters = new_counters
+    search_index = SearchIndex(new_store, cache_size=QUERY_CACHE_SIZE)
+    loaded_version = version
+    recommendation_cache.clear()
 
-def get_db():
-    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
-    conn.row_factory = sqlite3.Row
-    return conn
+def get_store():
+    """Return the current product store, loading the data on first use"""
+    if store is None:
+        init_data()
+    else:
+        check_reload()
+    return store
 
-def init_db():
-    """Initialize the database and load the data"""
-    # Initialize data
-    init_data()
+def reload_data():
+    """Reload the catalog unless another thread already is"""
+    global reload_requested
+    if not reload_lock.acquire(blocking=False):
+        return
+    try:
+        reload_requested = False
+        init_data()
+    except Exception as e:
+        print(f"Error reloading ML data: {str(e)}")
+    finally:
+        reload_lock.release()
+
+def check_reload():
+    """Start a background reload if one was requested or the catalog files changed.
+
+    Requests keep using the current store until the new one is published.
+    """
+    global last_reload_check, reload_requested
+    now = time.monotonic()
+    if not reload_requested:
+        if not RELOAD_CHECK_INTERVAL or now - last_reload_check < RELOAD_CHECK_INTERVAL:
+            return
+        last_reload_check = now
+        try:
+            if data_version() == loaded_version:
+                return
+        except OSError as e:
+            print(f"Error checking ML data version: {str(e)}")
+            return
     
-    # Set up database
+    reload_requested = False
+    threading.Thread(target=reload_data, daemon=True).start()
+
+def request_reload(signum=None, frame=None):
+    """Ask for the catalog to be reloaded on the next request; usable as a signal handler"""
+    global reload_requested
+    reload_requested = True
+
+def install_reload_signal():
+    """Reload the catalog when this process receives RELOAD_SIGNAL"""
+    if RELOAD_SIGNAL:
+        signal.signal(getattr(signal, RELOAD_SIGNAL), request_reload)
+
+def prepare_fork():
+    """Get this process ready to fork workers that share its catalog.
+
+    Called in the gunicorn master with --preload: the catalog is loaded
+    once, state that must not cross a fork is dropped, and the objects
+    loaded so far are moved out of the garbage collector's reach so the
+    workers' collections don't write to (and so copy) their pages.
+    No threads may be started here: a lock held by one at fork time
+    stays locked in every worker.
+    """
+    # Load directly rather than through get_store(), which can start a
+    # background reload
+    if store is None:
+        init_data()
+    flush_product_popularity()
+    close_connections()
+    gc.collect()
+    gc.freeze()
+
+def _top_indices(scores, top_n):
+    """Return the indices of the top_n highest scores along the last axis, best first"""
+    top_n = min(top_n, scores.shape[-1])
+    if top_n <= 0:
+        return np.empty(scores.shape[:-1] + (0,), dtype=np.intp)
+    candidates = np.argpartition(-scores, top_n - 1, axis=-1)[..., :top_n]
+    # Break ties by row position so results are deterministic
+    order = np.lexsort((candidates, -np.take_along_axis(scores, candidates, axis=-1)), axis=-1)
+    return np.take_along_axis(candidates, order, axis=-1)
+
+def get_db():
+    """Return the calling thread's pooled connection to the feedback database"""
+    return get_connection(DB_PATH)
+
+def create_schema():
+    """Create or upgrade the feedback database tables and indexes.
+
+    Run by the init_ml_db command before the app serves requests, never at
+    import time, so commands and tests leave the database file alone.
+    """
     conn = get_db()
     cursor = conn.cursor()
     
@@ -95,28 +260,100 @@ def init_db():
         )
     ''')
     
+    # Collapse duplicate preference rows left behind before the unique index
+    # existed, keeping the highest score for each category pair
+    cursor.execute('''
+        DELETE FROM user_preferences
+        WHERE id NOT IN (
+            SELECT id FROM (
+                SELECT id, ROW_NUMBER() OVER (
+                    PARTITION BY customer_id, category, subcategory
+                    ORDER BY preference_score DESC, id DESC
+                ) AS rank
+                FROM user_preferences
+            )
+            WHERE rank = 1
+        )
+    ''')
+    
+    # Index the per-customer lookups; the unique key is also the conflict
+    # target of the preference upserts in consume_clicks
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_user_interactions_customer
+        ON user_interactions (customer_id, product_id, interaction_type)
+    ''')
+    
+    cursor.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_user_preferences_customer
+        ON user_preferences (customer_id, category, subcategory)
+    ''')
+    
+    # Merge duplicate popularity rows so product_id can carry a unique key
+    cursor.execute('''
+        UPDATE product_popularity
+        SET view_count = (
+                SELECT SUM(view_count) FROM product_popularity AS other
+                WHERE other.product_id = product_popularity.product_id
+            ),
+            click_count = (
+                SELECT SUM(click_count) FROM product_popularity AS other
+                WHERE other.product_id = product_popularity.product_id
+            )
+        WHERE id IN (
+            SELECT MIN(id) FROM product_popularity
+            GROUP BY product_id HAVING COUNT(*) > 1
+        )
+    ''')
+    
+    cursor.execute('''
+        DELETE FROM product_popularity
+        WHERE id NOT IN (SELECT MIN(id) FROM product_popularity GROUP BY product_id)
+    ''')
+    
+    # Unique key for the ON CONFLICT(product_id) upserts, and a covering
+    # index that serves get_popular_products in ranking order
+    cursor.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_product_popularity_product
+        ON product_popularity (product_id)
+    ''')
+    
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_product_popularity_rank
+        ON product_popularity ((view_count + click_count) DESC, product_id, view_count, click_count)
+    ''')
+    
+    # Position of each log consumer in user_interactions; clicks logged
+    # before the consumer existed were already applied when they happened
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS ingest_offsets (
+            name TEXT PRIMARY KEY,
+            last_id INTEGER NOT NULL
+        )
+    ''')
+    
+    cursor.execute('''
+        INSERT OR IGNORE INTO ingest_offsets (name, last_id)
+        SELECT ?, COALESCE(MAX(id), 0) FROM user_interactions
+    ''', (CLICK_LOG,))
+    
     conn.commit()
-    conn.close()
 
-def get_user_interactions(customer_id):
-    """Get user interactions from the database"""
+def init_db():
+    """Initialize the database and load the data"""
+    create_schema()
+    
+    # Load the data once the tables exist, so the popularity counters are seeded from them
+    init_data()
+
+def _read_popularity():
+    """Read every (product_id, view_count, click_count) row, or none if the table is missing"""
     try:
-        conn = get_db()
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT product_id, interaction_type, COUNT(*) as count
-            FROM user_interactions
-            WHERE customer_id = ?
-            GROUP BY product_id, interaction_type
-        ''', (customer_id,))
-        
-        interactions = cursor.fetchall()
-        conn.close()
-        
-        return [dict(row) for row in interactions]
-    except Exception as e:
-        print(f"Error getting interactions: {str(e)}")
+        return get_db().execute('''
+            SELECT product_id, view_count, click_count
+            FROM product_popularity
+        ''').fetchall()
+    except sqlite3.Error as e:
+        print(f"Error reading product popularity: {str(e)}")
         return []
 
 def get_preferences(customer_id):
@@ -133,246 +370,444 @@ def get_preferences(customer_id):
         ''', (customer_id,))
         
         preferences = cursor.fetchall()
-        conn.close()
+        metrics.count_query('preferences', len(preferences))
         
         return [dict(row) for row in preferences]
     except Exception as e:
         print(f"Error getting preferences: {str(e)}")
         return []
 
-def get_product_interactions():
-    """Get product interaction counts from the database"""
-    try:
-        conn = get_db()
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT product_id, click_count, view_count
-            FROM product_popularity
-        ''')
-        
-        popularity_data = cursor.fetchall()
-        conn.close()
-        
-        # Create a dictionary of product interactions
-        product_interactions = {}
-        for row in popularity_data:
-            product_interactions[row['product_id']] = {
-                'click_count': row['click_count'],
-                'view_count': row['view_count']
-            }
-        
-        return product_interactions
-    except Exception as e:
-        print(f"Error getting product interactions: {str(e)}")
-        return {}
+def _read_by_customer(name, query, customer_ids):
+    """Run query for chunks of customer_ids and group the rows by customer_id"""
+    rows = {}
+    conn = get_db()
+    for start in range(0, len(customer_ids), SQL_CHUNK_SIZE):
+        chunk = customer_ids[start:start + SQL_CHUNK_SIZE]
+        placeholders = ', '.join('?' * len(chunk))
+        fetched = conn.execute(query.format(placeholders=placeholders), chunk).fetchall()
+        metrics.count_query(name, len(fetched))
+        for row in fetched:
+            rows.setdefault(row['customer_id'], []).append(row)
+    return rows
 
-def get_top_recommendations(customer_id, top_n=5):
-    """Get personalized recommendations for a user"""
-    global customer_df, product_df
+def _customer_vectors(product_store, customer_ids):
+    """Build the customers x features preference matrix used for scoring"""
+    customers = customer_store
     
-    if customer_df is None or product_df is None:
-        init_data()
+    # Start from the customer's profile, weighted by their segment, if known
+    with metrics.stage('customer_lookup'):
+        vectors = np.zeros((len(customer_ids), len(product_store.features)))
+        positions = customers.lookup(customer_ids)
+        found = positions >= 0
+        vectors[found] = customers.profile_vectors[positions[found]] * customers.profile_weights[positions[found], None]
     
-    try:
-        # Get customer preferences
-        customer_vector = np.zeros(len(features))
-        preference_vector = np.zeros(len(features))
-        
-        # Add weights from historical data if available
-        if customer_id in customer_df['Customer_ID'].values:
-            customer_data = customer_df[customer_df['Customer_ID'] == customer_id].iloc[0]
-            # Use historical preferences as base weights
-            for feature in features:
-                if feature in customer_data:
-                    customer_vector[features.index(feature)] = customer_data[feature]
-        
-        # Get user interactions from database
-        interactions = get_user_interactions(customer_id)
+    with metrics.stage('db_reads'):
+        try:
+            # Get user interactions and preferences from the database in bulk
+            interactions = _read_by_customer('interactions', '''
+                SELECT customer_id, product_id, interaction_type, COUNT(*) as count
+                FROM user_interactions
+                WHERE customer_id IN ({placeholders})
+                GROUP BY customer_id, product_id, interaction_type
+            ''', customer_ids)
+            preferences = _read_by_customer('preferences', '''
+                SELECT customer_id, category, subcategory, preference_score
+                FROM user_preferences
+                WHERE customer_id IN ({placeholders})
+            ''', customer_ids)
+        except sqlite3.Error as e:
+            print(f"Error getting interactions: {str(e)}")
+            interactions, preferences = {}, {}
+    
+    with metrics.stage('preference_vectors'):
+        preference_vectors = np.zeros_like(vectors)
         
         # Add weights from interactions
-        for interaction in interactions:
-            product_id = interaction['product_id']
-            if product_id in product_df['Product_ID'].values:
-                product_data = product_df[product_df['Product_ID'] == product_id].iloc[0]
-                weight = 1.0 if interaction['interaction_type'] == 'click' else 0.5
-                weight *= interaction['count']
-                for feature in features:
-                    preference_vector[features.index(feature)] += product_data[feature] * weight
-        
-        # Get user preferences from database
-        preferences = get_preferences(customer_id)
-        
-        # Add weights from preferences
-        for pref in preferences:
-            category_mask = product_df['Category'] == pref['category']
-            subcategory_mask = product_df['Subcategory'] == pref['subcategory']
-            product_mask = category_mask & subcategory_mask
+        owners, rows, weights = [], [], []
+        for position, customer_id in enumerate(customer_ids):
+            for interaction in interactions.get(customer_id, ()):
+                idx = product_store.product_index.get(interaction['product_id'])
+                if idx is not None:
+                    weight = 1.0 if interaction['interaction_type'] == 'click' else 0.5
+                    owners.append(position)
+                    rows.append(idx)
+                    weights.append(weight * interaction['count'])
+        if rows:
+            np.add.at(preference_vectors, owners, np.asarray(weights)[:, None] * product_store.feature_matrix[rows])
+        
+        # Add weights from preferences using the per-group feature means
+        owners, codes, scores = [], [], []
+        for position, customer_id in enumerate(customer_ids):
+            customer_codes, customer_scores = product_store.preference_groups(preferences.get(customer_id, ()))
+            owners.extend([position] * len(customer_codes))
+            codes.extend(customer_codes)
+            scores.extend(customer_scores)
+        if codes:
+            np.add.at(preference_vectors, owners, np.asarray(scores)[:, None] * product_store.group_means[codes])
+        
+        # Normalize preference vectors and blend them into the customer vectors
+        norms = np.linalg.norm(preference_vectors, axis=1)
+        active = norms > 0
+        vectors[active] = (vectors[active] + preference_vectors[active] / norms[active, None]) / 2
+    return vectors
+
+def scoring_chunk_size(products):
+    """Return how many customers to score at once so their buffers fit SCORING_MEMORY_BUDGET"""
+    return max(1, SCORING_MEMORY_BUDGET // (max(products, 1) * SCORE_BYTES))
+
+def _compute_top_recommendations(customer_ids, top_n):
+    """Score the catalog for a list of customers and rank their top_n products.
+
+    Customers are scored in chunks sized by scoring_chunk_size(), each with
+    one matrix multiply and a batched top-N selection, against a single
+    popularity snapshot. Returns a Ranking per customer, keyed by customer_id.
+    """
+    product_store = get_store()
+    version = loaded_version
+    with metrics.stage('popularity_boost'):
+        boost = popularity_counters.click_boost()
+    product_features = product_store.feature_matrix
+    chunk_size = scoring_chunk_size(len(product_features))
+    
+    results = {}
+    for start in range(0, len(customer_ids), chunk_size):
+        chunk = customer_ids[start:start + chunk_size]
+        vectors = _customer_vectors(product_store, chunk)
+        
+        with metrics.stage('similarity'):
+            norms = np.linalg.norm(vectors, axis=1)
+            has_profile = norms > 0
             
-            if product_mask.any():
-                product_features = product_df.loc[product_mask, features].mean()
-                weight = pref['preference_score']
-                preference_vector += product_features * weight
-        
-        # Normalize preference vector
-        if np.any(preference_vector):
-            preference_vector = preference_vector / np.linalg.norm(preference_vector)
-            customer_vector = (customer_vector + preference_vector) / 2
-        
-        # Calculate recommendations
-        if np.any(customer_vector):
-            # Calculate similarity scores
-            product_features = product_df[features]
-            similarity = cosine_similarity(customer_vector.reshape(1, -1), product_features)[0]
+            # Calculate recommendations into request-local buffers; the shared
+            # store is never written to. Cosine similarity uses the precomputed
+            # product norms; customers without any data get default weights
+            similarity = np.matmul(vectors.astype(np.float32), product_features.T)
+            similarity /= product_store.feature_norms
+            similarity[has_profile] /= norms[has_profile, None].astype(np.float32)
+            similarity[~has_profile] = 1.0
+        metrics.inc('ml_products_scored_total', similarity.size)
+        
+        with metrics.stage('popularity_boost'):
+            # Apply popularity boost based on click counts
+            similarity *= boost
+        
+        with metrics.stage('ranking'):
+            # Calculate final recommendation score: 0.4 from user preferences and
+            # interactions plus the precomputed product quality, customer
+            # satisfaction and historical recommendation probability terms
+            final_score = np.multiply(similarity, np.float32(0.4))
+            final_score += product_store.quality_scores
+            
+            # Ensure final score is between 0 and 1
+            np.clip(final_score, 0, 1, out=final_score)
+            
+            # Select the top products of every customer without sorting the catalog
+            top_indices = _top_indices(final_score, top_n)
+            for position, customer_id in enumerate(chunk):
+                rows = top_indices[position]
+                results[customer_id] = Ranking(version, rows, {
+                    'Similarity_Score': similarity[position, rows],
+                    'Final_Score': final_score[position, rows],
+                })
+    
+    return results
+
+def _top_rankings(customer_ids):
+    """Return the ranking of the best RANKED_CANDIDATES products of each customer.
+
+    Each customer has one cached ranking that every top_n and page is
+    sliced from; the customers missing from the cache are scored together.
+    Customers whose scoring failed are left out of the returned dict.
+    """
+    rankings = {}
+    missing = []
+    for customer_id in dict.fromkeys(customer_ids):
+        with metrics.stage('cache_lookup'):
+            ranking = recommendation_cache.get(customer_id, RANKED_CANDIDATES)
+        # A shared cache can hold rankings of another catalog version
+        if ranking is None or ranking.version != loaded_version:
+            missing.append(customer_id)
         else:
-            # If no user data, use default weights
-            similarity = np.ones(len(product_df))
-        
-        product_df['Similarity'] = similarity
-        
-        # Get click counts for each product
-        product_interactions = get_product_interactions()
-        
-        # Apply popularity boost based on click counts
-        max_clicks = max([interactions['click_count'] for interactions in product_interactions.values()], default=1)
-        for product_id, interactions in product_interactions.items():
-            if product_id in product_df['Product_ID'].values:
-                click_boost = 1 + (interactions['click_count'] / max_clicks * 0.2)
-                product_df.loc[product_df['Product_ID'] == product_id, 'Similarity'] *= click_boost
-        
-        # Calculate final recommendation score
-        product_df['Final_Score'] = (
-            0.4 * product_df['Similarity'] +  # User preferences and interactions
-            0.2 * product_df['Product_Rating'] +  # Product quality
-            0.2 * product_df['Customer_Review_Sentiment_Score'] +  # Customer satisfaction
-            0.2 * product_df['Probability_of_Recommendation']  # Historical recommendation probability
+            rankings[customer_id] = ranking
+    
+    if missing:
+        try:
+            computed = _compute_top_recommendations(missing, RANKED_CANDIDATES)
+        except Exception as e:
+            print(f"Error scoring recommendations: {str(e)}")
+            return rankings
+        for customer_id, ranking in computed.items():
+            recommendation_cache.set(customer_id, RANKED_CANDIDATES, ranking)
+        rankings.update(computed)
+    return rankings
+
+def get_top_recommendations(customer_id, top_n=5):
+    """Get personalized recommendations for a user, at most RANKED_CANDIDATES of them"""
+    return get_top_recommendations_batch([customer_id], top_n)[customer_id]
+
+def get_top_recommendations_batch(customer_ids, top_n=5):
+    """Get personalized recommendations for many users, as a dict keyed by customer_id.
+
+    Cached rankings are reused and the rest are scored together; every new
+    ranking is cached, so this also pre-warms the recommendation cache.
+    """
+    rankings = _top_rankings(customer_ids)
+    product_store = get_store()
+    with metrics.stage('serialize'):
+        return {
+            customer_id: rankings[customer_id].records(product_store, 0, top_n) if customer_id in rankings else []
+            for customer_id in dict.fromkeys(customer_ids)
+        }
+
+def _ranked_page(owner, rank, top_n, cursor):
+    """Return (page, next cursor) of a ranking computed once per session.
+
+    rank() returns the Ranking of the best RANKED_CANDIDATES results.
+    Without a cursor it is called, the ranking kept in ranked_pages under a
+    new token, and the records of the first top_n results returned; the
+    cursor of each following page slices the kept ranking. If the ranking
+    has expired it is computed again and the page is taken from the new
+    ranking at the same offset. The next cursor is None once the ranking
+    is exhausted. Raises ValueError for a malformed cursor or one past the
+    ranking, so a forged cursor cannot make anything score deeper.
+    """
+    token, offset = parse_cursor(cursor, RANKED_CANDIDATES) if cursor else (None, 0)
+    ranking = ranked_pages.get(owner, token) if token else None
+    if ranking is None or ranking.version != loaded_version:
+        ranking = rank()
+        token = ranked_pages.put(owner, ranking)
+    
+    with metrics.stage('serialize'):
+        page = ranking.records(get_store(), offset, offset + top_n)
+    end = offset + len(page)
+    return page, make_cursor(token, end) if end < len(ranking) else None
+
+def get_recommendation_page(customer_id, top_n=5, cursor=None):
+    """Get a page of a customer's recommendations and the cursor of the next one"""
+    def rank():
+        ranking = _top_rankings([customer_id]).get(customer_id)
+        return ranking if ranking is not None else Ranking(loaded_version, [], {})
+    
+    return _ranked_page(('recommend', customer_id), rank, top_n, cursor)
+
+def get_search_page(customer_id, query, top_n=5, cursor=None):
+    """Get a page of search results and the cursor of the next one"""
+    return _ranked_page(
+        ('search', customer_id, query),
+        lambda: _rank_query(customer_id, query, RANKED_CANDIDATES),
+        top_n, cursor
+    )
+
+def _upsert_popularity(conn, rows):
+    """Add (product_id, view_delta, click_delta) rows to the popularity counts"""
+    conn.executemany('''
+        INSERT INTO product_popularity (product_id, view_count, click_count)
+        VALUES (?, ?, ?)
+        ON CONFLICT(product_id) DO UPDATE SET
+        view_count = view_count + excluded.view_count,
+        click_count = click_count + excluded.click_count,
+        last_updated = CURRENT_TIMESTAMP
+    ''', rows)
+
+def _write_popularity(rows):
+    """Apply a batch of (product_id, view_delta, click_delta) rows in one transaction"""
+    conn = get_db()
+    with conn:
+        _upsert_popularity(conn, rows)
+    
+    # Pick up increments written by other worker processes
+    global last_popularity_sync
+    if time.monotonic() - last_popularity_sync >= POPULARITY_RESYNC_INTERVAL:
+        last_popularity_sync = time.monotonic()
+        counters = popularity_counters
+        if counters is not None:
+            counters.load(_read_popularity())
+
+# Seconds between reloads of the resident counters from the database
+POPULARITY_RESYNC_INTERVAL = getattr(settings, 'ML_POPULARITY_RESYNC_INTERVAL', 30.0)
+last_popularity_sync = time.monotonic()
+
+popularity_buffer = PopularityBuffer(
+    _write_popularity,
+    interval=getattr(settings, 'ML_POPULARITY_FLUSH_INTERVAL', 2.0),
+    max_pending=getattr(settings, 'ML_POPULARITY_FLUSH_SIZE', 500)
+)
+
+def _record_popularity(product_id, views=0, clicks=0):
+    """Count an interaction in memory and queue it for the database"""
+    counters = popularity_counters
+    if counters is not None:
+        counters.add(product_id, views=views, clicks=clicks)
+    popularity_buffer.add(product_id, views=views, clicks=clicks)
+
+def record_product_views(product_ids):
+    """Record a view for each product shown to a user"""
+    for product_id in product_ids:
+        _record_popularity(product_id, views=1)
+
+def record_click(customer_id, product_id):
+    """Validate a click against the catalog and append it to the interaction log.
+
+    Returns False for products that are not in the catalog. Preferences
+    and popularity are updated from the log by the click consumer.
+    """
+    if product_id not in get_store().product_index:
+        return False
+    
+    conn = get_db()
+    with conn:
+        conn.execute('''
+            INSERT INTO user_interactions (customer_id, product_id, interaction_type)
+            VALUES (?, ?, 'click')
+        ''', (customer_id, product_id))
+    
+    # The click itself counts as soon as it is logged, so drop this worker's
+    # cached lists now; the consumer invalidates again once the preference
+    # is folded in, which reaches other workers only through a shared cache
+    recommendation_cache.invalidate(customer_id)
+    click_consumer.start()
+    return True
+
+def consume_clicks(batch_size):
+    """Fold the next batch of logged clicks into preferences and popularity.
+
+    The batch is claimed and applied in one write transaction together with
+    the consumer offset, so every click is applied exactly once even with a
+    consumer in each worker process. Returns the number of clicks folded.
+    """
+    product_store = get_store()
+    conn = get_db()
+    with conn:
+        conn.execute('BEGIN IMMEDIATE')
+        last_id = conn.execute(
+            'SELECT last_id FROM ingest_offsets WHERE name = ?', (CLICK_LOG,)
+        ).fetchone()['last_id']
+        clicks = conn.execute('''
+            SELECT id, customer_id, product_id
+            FROM user_interactions
+            WHERE id > ? AND interaction_type = 'click'
+            ORDER BY id
+            LIMIT ?
+        ''', (last_id, batch_size)).fetchall()
+        if not clicks:
+            return 0
+        
+        # Each click adds 0.1 to the customer's category preference
+        preference_deltas = {}
+        click_counts = {}
+        for click in clicks:
+            product_id = click['product_id']
+            click_counts[product_id] = click_counts.get(product_id, 0) + 1
+            idx = product_store.product_index.get(product_id)
+            if idx is not None:
+                key = (click['customer_id'], str(product_store.categories[idx]), str(product_store.subcategories[idx]))
+                preference_deltas[key] = preference_deltas.get(key, 0) + 0.1
+        
+        conn.executemany('''
+            INSERT INTO user_preferences (customer_id, category, subcategory, preference_score)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT(customer_id, category, subcategory) DO UPDATE SET
+            preference_score = preference_score + excluded.preference_score,
+            last_updated = CURRENT_TIMESTAMP
+        ''', [key + (delta,) for key, delta in preference_deltas.items()])
+        _upsert_popularity(conn, [(product_id, 0, count) for product_id, count in click_counts.items()])
+        conn.execute(
+            'UPDATE ingest_offsets SET last_id = ? WHERE name = ?', (clicks[-1]['id'], CLICK_LOG)
         )
-        
-        # Ensure final score is between 0 and 1
-        product_df['Final_Score'] = product_df['Final_Score'].clip(0, 1)
-        
-        # Sort by final score in descending order
-        top_products = product_df.sort_values(by='Final_Score', ascending=False).head(top_n)
-        
-        # Convert to list of dictionaries
-        recommendations = []
-        for _, product in top_products.iterrows():
-            recommendations.append({
-                'Product_ID': product['Product_ID'],
-                'Brand': product['Brand'],
-                'Category': product['Category'],
-                'Subcategory': product['Subcategory'],
-                'Similarity_Score': float(product['Similarity']),
-                'Final_Score': float(product['Final_Score'])
-            })
-        
-        return recommendations
-    except Exception as e:
-        print(f"Error in get_top_recommendations: {str(e)}")
-        return []
+    
+    counters = popularity_counters
+    if counters is not None:
+        for product_id, count in click_counts.items():
+            counters.add(product_id, clicks=count)
+    for customer_id in {customer_id for customer_id, _, _ in preference_deltas}:
+        recommendation_cache.invalidate(customer_id)
+    return len(clicks)
 
-def update_user_preferences(customer_id, product_data):
-    """Update user preferences based on product interaction"""
-    try:
-        conn = get_db()
-        cursor = conn.cursor()
-        
-        # Update or insert preference for category and subcategory
-        cursor.execute('''
-            INSERT OR REPLACE INTO user_preferences (customer_id, category, subcategory, preference_score)
-            VALUES (?, ?, ?, COALESCE(
-                (SELECT preference_score + 0.1 FROM user_preferences 
-                WHERE customer_id = ? AND category = ? AND subcategory = ?),
-                0.1
-            ))
-        ''', (
-            customer_id, product_data['Category'], product_data['Subcategory'],
-            customer_id, product_data['Category'], product_data['Subcategory']
-        ))
-        
-        conn.commit()
-        conn.close()
-    except Exception as e:
-        print(f"Error updating preferences: {str(e)}")
+click_consumer = LogConsumer(
+    consume_clicks,
+    batch_size=getattr(settings, 'ML_CLICK_BATCH_SIZE', 1000),
+    interval=getattr(settings, 'ML_CLICK_CONSUME_INTERVAL', 0.5)
+)
 
-def update_product_popularity(product_id, interaction_type):
-    """Update product popularity based on user interaction"""
-    try:
-        conn = get_db()
-        cursor = conn.cursor()
-        
-        # Update view or click count
-        if interaction_type == 'view':
-            cursor.execute('''
-                INSERT INTO product_popularity (product_id, view_count)
-                VALUES (?, 1)
-                ON CONFLICT(product_id) DO UPDATE SET
-                view_count = view_count + 1,
-                last_updated = CURRENT_TIMESTAMP
-            ''', (product_id,))
-        elif interaction_type == 'click':
-            cursor.execute('''
-                INSERT INTO product_popularity (product_id, click_count)
-                VALUES (?, 1)
-                ON CONFLICT(product_id) DO UPDATE SET
-                click_count = click_count + 1,
-                last_updated = CURRENT_TIMESTAMP
-            ''', (product_id,))
-        
-        conn.commit()
-        conn.close()
-    except Exception as e:
-        print(f"Error updating product popularity: {str(e)}")
+def flush_product_popularity():
+    """Write any buffered popularity updates to the database"""
+    popularity_buffer.flush()
 
 def get_query_recommendations(customer_id, query, top_n=5):
     """Get recommendations based on search query and user preferences"""
-    global customer_df, product_df, tfidf, tfidf_matrix
-    
-    if customer_df is None or product_df is None:
-        init_data()
+    ranking = _rank_query(customer_id, query, top_n)
+    with metrics.stage('serialize'):
+        return ranking.records(get_store())
+
+def _rank_query(customer_id, query, top_n):
+    """Rank the top_n search results of query for a customer; an empty Ranking on errors"""
+    product_store = get_store()
+    version = loaded_version
+    index = search_index
     
     try:
-        # Get text similarity
-        query_vector = tfidf.transform([query])
-        text_sim = cosine_similarity(query_vector, tfidf_matrix)[0]
-        product_df['Text_Similarity'] = text_sim
+        # Get text similarity of the products sharing a term with the query
+        with metrics.stage('search_text'):
+            text_rows, text_scores = index.text_matches(query)
         
         # Get customer preferences
-        preferences = get_preferences(customer_id)
-        
-        # Calculate preference-based score
-        preference_score = np.zeros(len(product_df))
-        for pref in preferences:
-            category_mask = product_df['Category'] == pref['category']
-            subcategory_mask = product_df['Subcategory'] == pref['subcategory']
-            product_mask = category_mask & subcategory_mask
-            preference_score[product_mask] += pref['preference_score']
-        
-        # Normalize preference score
-        if preference_score.max() > 0:
-            preference_score = preference_score / preference_score.max()
-        
-        # Combine text similarity and preference score
-        product_df['Combined_Score'] = 0.7 * product_df['Text_Similarity'] + 0.3 * preference_score
-        
-        # Get top results
-        top_results = product_df.sort_values(by='Combined_Score', ascending=False).head(top_n)
-        
-        # Convert to list of dictionaries
-        recommendations = []
-        for _, product in top_results.iterrows():
-            recommendations.append({
-                'Product_ID': product['Product_ID'],
-                'Brand': product['Brand'],
-                'Category': product['Category'],
-                'Subcategory': product['Subcategory'],
-                'Text_Similarity': float(product['Text_Similarity']),
-                'Combined_Score': float(product['Combined_Score'])
-            })
-        
-        return recommendations
+        with metrics.stage('db_reads'):
+            preferences = get_preferences(customer_id)
+        
+        with metrics.stage('ranking'):
+            # Calculate preference-based score per group
+            codes, scores = product_store.preference_groups(preferences)
+            group_scores = np.zeros(len(product_store.group_means), dtype=np.float32)
+            np.add.at(group_scores, codes, scores)
+            
+            # Normalize preference score
+            max_preference = group_scores.max(initial=0)
+            if max_preference > 0:
+                group_scores /= max_preference
+            
+            # Only products matching the query or in a preferred group can score
+            # above zero, so score just those candidates
+            candidates = np.union1d(text_rows, index.group_members(np.flatnonzero(group_scores > 0)))
+            text_sim = np.zeros(len(candidates), dtype=np.float32)
+            text_sim[np.searchsorted(candidates, text_rows)] = text_scores
+            
+            # Combine text similarity and preference score
+            combined_score = group_scores[product_store.group_codes[candidates]]
+            combined_score *= np.float32(0.3)
+            combined_score += np.float32(0.7) * text_sim
+            
+            # Get top results
+            top = _top_indices(combined_score, top_n)
+            rows = candidates[top]
+            text_similarity = text_sim[top]
+            score = combined_score[top]
+            
+            # Fill up with the first zero-scoring products, as a full ranking would
+            missing = min(top_n, len(product_store)) - len(rows)
+            if missing > 0:
+                filler = np.setdiff1d(np.arange(min(len(candidates) + missing, len(product_store))), candidates)[:missing]
+                rows = np.concatenate((rows, filler))
+                text_similarity = np.concatenate((text_similarity, np.zeros(len(filler), dtype=np.float32)))
+                score = np.concatenate((score, np.zeros(len(filler), dtype=np.float32)))
+        
+        return Ranking(version, rows, {
+            'Text_Similarity': text_similarity,
+            'Combined_Score': score,
+        })
     except Exception as e:
         print(f"Error in get_query_recommendations: {str(e)}")
+        return Ranking(version, [], {})
+
+def get_autocomplete_suggestions(prefix, limit=10):
+    """Complete a partial search against the brand, category and subcategory names"""
+    get_store()
+    try:
+        return [
+            {'Suggestion': text, 'Field': field, 'Product_Count': count}
+            for text, field, count in search_index.suggest(prefix, limit)
+        ]
+    except Exception as e:
+        print(f"Error getting autocomplete suggestions: {str(e)}")
         return []
 
 def get_popular_products(top_n=10):
@@ -389,7 +824,6 @@ def get_popular_products(top_n=10):
         ''', (top_n,))
         
         popular_products = cursor.fetchall()
-        conn.close()
         
         # Convert to list of dictionaries
         results = []
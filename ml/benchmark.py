@@ -0,0 +1,320 @@
+import asyncio
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+from . import app
+
+# Category -> subcategories of the synthetic catalog, as in the shipped data
+TAXONOMY = {
+    'Beauty': ['Lipstick', 'Moisturizer', 'Perfume', 'Foundation'],
+    'Books': ['Comics', 'Non-fiction', 'Fiction', 'Biography'],
+    'Electronics': ['Laptop', 'Smartphone', 'Headphones', 'Smartwatch'],
+    'Fashion': ['Jeans', 'T-shirt', 'Shoes', 'Jacket'],
+    'Fitness': ['Treadmill', 'Resistance Bands', 'Dumbbells', 'Yoga Mat'],
+    'Home Decor': ['Cushions', 'Curtains', 'Wall Art', 'Lamp'],
+}
+SEGMENTS = ['New Visitor', 'Occasional Shopper', 'Frequent Buyer']
+SEASONS = ['Summer', 'Winter', 'Spring', 'Autumn']
+LOCATIONS = ['Canada', 'India', 'Germany', 'USA', 'UK']
+
+# Share of each endpoint in a generated request mix
+DEFAULT_MIX = {
+    'recommend': 0.5,
+    'search': 0.3,
+    'click': 0.15,
+    'autocomplete': 0.05,
+}
+
+PERCENTILES = (50, 95, 99)
+
+
+def generate_catalog(products, customers, seed=0):
+    """Return synthetic (product, customer) frames in the schema of the CSV files.
+
+    The number of brands grows with the catalog so search vocabularies and
+    brand groups keep a realistic size at every scale.
+    """
+    rng = np.random.default_rng(seed)
+    pairs = [(category, subcategory) for category, subcategories in TAXONOMY.items() for subcategory in subcategories]
+    pair_codes = rng.integers(len(pairs), size=products)
+    brands = np.array([f'Brand {i}' for i in range(max(4, products // 250))])
+
+    product_df = pd.DataFrame({
+        'Product_ID': np.char.add('P', np.arange(products).astype(str)),
+        'Category': np.array([category for category, _ in pairs])[pair_codes],
+        'Subcategory': np.array([subcategory for _, subcategory in pairs])[pair_codes],
+        'Price': rng.integers(100, 5001, size=products),
+        'Brand': brands[rng.integers(len(brands), size=products)],
+        'Average_Rating_of_Similar_Products': rng.uniform(3.0, 5.0, size=products).round(1),
+        'Product_Rating': rng.uniform(1.0, 5.0, size=products).round(1),
+        'Customer_Review_Sentiment_Score': rng.uniform(0.0, 1.0, size=products).round(2),
+        'Holiday': rng.choice(['Yes', 'No'], size=products),
+        'Season': rng.choice(SEASONS, size=products),
+        'Geographical_Location': rng.choice(LOCATIONS, size=products),
+        'Similar_Product_List': '[]',
+        'Probability_of_Recommendation': rng.uniform(0.1, 1.0, size=products).round(2),
+    })
+
+    categories = list(TAXONOMY)
+    subcategories = [subcategory for _, subcategory in pairs]
+    customer_df = pd.DataFrame({
+        'Customer_ID': np.char.add('C', np.arange(customers).astype(str)),
+        'Age': rng.integers(18, 70, size=customers),
+        'Gender': rng.choice(['Female', 'Male', 'Other'], size=customers),
+        'Location': rng.choice(['Chennai', 'Delhi', 'Bangalore', 'Kolkata', 'Mumbai'], size=customers),
+        'Browsing_History': [
+            str(list(rng.choice(categories, size=rng.integers(1, 4), replace=False))) for _ in range(customers)
+        ],
+        'Purchase_History': [
+            str(list(rng.choice(subcategories, size=rng.integers(0, 4), replace=False))) for _ in range(customers)
+        ],
+        'Customer_Segment': rng.choice(SEGMENTS, size=customers),
+        'Avg_Order_Value': rng.uniform(100, 5000, size=customers).round(2),
+        'Holiday': rng.choice(['Yes', 'No'], size=customers),
+        'Season': rng.choice(SEASONS, size=customers),
+    })
+    return product_df, customer_df
+
+
+def generate_workload(product_df, customer_df, requests, mix=None, seed=0):
+    """Return a list of request dicts drawn from mix over the given catalog.
+
+    Customers are drawn from a Zipf distribution so a few of them come back
+    often, as on the live site, and queries mix exact names, prefixes and
+    misspellings.
+    """
+    rng = np.random.default_rng(seed)
+    mix = mix or DEFAULT_MIX
+    endpoints = list(mix)
+    weights = np.array([mix[endpoint] for endpoint in endpoints], dtype=float)
+    kinds = rng.choice(endpoints, size=requests, p=weights / weights.sum())
+
+    customer_ids = customer_df['Customer_ID'].to_numpy(dtype=str)
+    product_ids = product_df['Product_ID'].to_numpy(dtype=str)
+    names = np.unique(np.concatenate([
+        product_df['Brand'].unique(), product_df['Category'].unique(), product_df['Subcategory'].unique()
+    ]).astype(str))
+
+    workload = []
+    for i, kind in enumerate(kinds):
+        request = {'request_id': f'bench-{i:06d}', 'endpoint': str(kind)}
+        if kind != 'autocomplete':
+            request['customer_id'] = str(customer_ids[(rng.zipf(1.3) - 1) % len(customer_ids)])
+        if kind in ('search', 'autocomplete'):
+            request['query'] = _query(rng, str(rng.choice(names)), kind)
+        if kind == 'click':
+            request['product_id'] = str(rng.choice(product_ids))
+        workload.append(request)
+    return workload
+
+
+def _query(rng, name, kind):
+    words = name.lower().split()
+    if kind == 'autocomplete':
+        return name.lower()[:rng.integers(1, len(name) + 1)]
+    roll = rng.random()
+    if roll < 0.2:
+        # Drop one letter of a longer word
+        word = max(words, key=len)
+        if len(word) > 4:
+            cut = rng.integers(1, len(word))
+            words[words.index(word)] = word[:cut] + word[cut + 1:]
+    elif roll < 0.4:
+        words[-1] = words[-1][:max(3, len(words[-1]) - 2)]
+    return ' '.join(words)
+
+
+def read_workload(path):
+    """Read a JSON-lines workload, one request object per line"""
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def write_workload(path, workload):
+    with open(path, 'w') as f:
+        for request in workload:
+            f.write(json.dumps(request) + '\n')
+
+
+def use_dataset(product_file, customer_file, db_path):
+    """Point the ML app at the given CSV files and feedback database and load them.
+
+    The snapshot and the periodic reload check are disabled so the catalog
+    always comes from these files.
+    """
+    app.PRODUCT_DATA_FILE = product_file
+    app.CUSTOMER_DATA_FILE = customer_file
+    app.DB_PATH = db_path
+    app.SNAPSHOT_DIR = None
+    app.RELOAD_CHECK_INTERVAL = 0
+    app.init_db()
+
+
+@contextmanager
+def synthetic_dataset(products, customers, seed=0, data_dir=None):
+    """Load a generated catalog into the ML app for the duration of the block.
+
+    Yields the (product, customer) frames. The CSV files and a fresh
+    feedback database are written to data_dir, or to a temporary directory.
+    On exit the pending feedback writes are applied to that database and
+    the app's own files are loaded again on next use.
+    """
+    from .views import feedback_queue
+
+    previous = (
+        app.PRODUCT_DATA_FILE, app.CUSTOMER_DATA_FILE, app.DB_PATH, app.SNAPSHOT_DIR, app.RELOAD_CHECK_INTERVAL
+    )
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        data_dir = data_dir or tmp_dir
+        os.makedirs(data_dir, exist_ok=True)
+        product_df, customer_df = generate_catalog(products, customers, seed)
+        product_file = os.path.join(data_dir, 'products.csv')
+        customer_file = os.path.join(data_dir, 'customers.csv')
+        product_df.to_csv(product_file, index=False)
+        customer_df.to_csv(customer_file, index=False)
+        db_path = os.path.join(data_dir, 'feedback.db')
+        if os.path.exists(db_path):
+            os.remove(db_path)
+
+        use_dataset(product_file, customer_file, db_path)
+        try:
+            yield product_df, customer_df
+        finally:
+            # Apply what the background writers still hold while the
+            # synthetic database is current, and stop the click consumer
+            # so it does not go on polling the restored one
+            feedback_queue.join()
+            app.flush_product_popularity()
+            app.click_consumer.stop()
+            app.click_consumer.drain()
+            (
+                app.PRODUCT_DATA_FILE, app.CUSTOMER_DATA_FILE, app.DB_PATH, app.SNAPSHOT_DIR,
+                app.RELOAD_CHECK_INTERVAL
+            ) = previous
+            app.ranked_pages.clear()
+            app.recommendation_cache.clear()
+            # Load the app's own catalog on next use rather than opening its
+            # database here
+            app.store = None
+
+
+def expected_status(request, status):
+    """Whether status is a valid answer to request; clicks on unknown products get a 404"""
+    return status == 200 or (status == 404 and request['endpoint'] == 'click')
+
+
+def request_path(request):
+    """Return the URL path and query parameters of a workload request"""
+    endpoint = request['endpoint']
+    if endpoint == 'recommend':
+        return f"/ml/recommend/{request['customer_id']}/", {}
+    if endpoint == 'search':
+        return f"/ml/search/{request['customer_id']}/", {'query': request.get('query', '')}
+    if endpoint == 'click':
+        return f"/ml/click/{request['customer_id']}/{request['product_id']}/", {}
+    if endpoint == 'autocomplete':
+        return '/ml/autocomplete/', {'query': request.get('query', '')}
+    if endpoint == 'preferences':
+        return f"/ml/preferences/{request['customer_id']}/", {}
+    raise ValueError(f"Unknown endpoint {endpoint}")
+
+
+async def replay(workload, concurrency=8):
+    """Send the workload through the ml views in-process.
+
+    Returns the {endpoint: [latency in seconds]} of every request, the
+    (request_id, status) of every request answered with an unexpected
+    status, and the wall-clock time of the run. Requests are sent as HTTPS
+    so SECURE_SSL_REDIRECT does not turn them into redirects.
+    """
+    from django.test import AsyncClient
+
+    client = AsyncClient()
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = {}
+    errors = []
+
+    async def send(request):
+        path, params = request_path(request)
+        async with semaphore:
+            start = time.perf_counter()
+            response = await client.get(path, params, secure=True)
+            elapsed = time.perf_counter() - start
+        latencies.setdefault(request['endpoint'], []).append(elapsed)
+        if not expected_status(request, response.status_code):
+            errors.append((request.get('request_id'), response.status_code))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(send(request) for request in workload))
+    return latencies, errors, time.perf_counter() - start
+
+
+def time_calls(fn, args_list):
+    """Call fn(*args) for each args in order; return the latency of each call"""
+    latencies = []
+    for args in args_list:
+        start = time.perf_counter()
+        fn(*args)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def summarize(latencies, elapsed):
+    """Return the count, throughput and latency percentiles (in ms) of a list of latencies"""
+    values = np.asarray(latencies) * 1000
+    summary = {
+        'count': len(values),
+        'throughput': round(len(values) / elapsed, 1) if elapsed else 0.0,
+        'mean_ms': round(float(values.mean()), 3) if len(values) else 0.0,
+    }
+    for q, value in zip(PERCENTILES, np.percentile(values, PERCENTILES) if len(values) else [0.0] * len(PERCENTILES)):
+        summary[f'p{q}_ms'] = round(float(value), 3)
+    return summary
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def compare(report, baseline, tolerance=0.2):
+    """Return a message for every endpoint that regressed against baseline.
+
+    An endpoint regresses when its p95 latency grows, or its throughput
+    drops, by more than tolerance (a fraction) relative to the baseline.
+    """
+    regressions = []
+    for endpoint, previous in baseline.get('endpoints', {}).items():
+        current = report['endpoints'].get(endpoint)
+        if current is None:
+            continue
+        if previous['p95_ms'] and current['p95_ms'] > previous['p95_ms'] * (1 + tolerance):
+            regressions.append(f"{endpoint}: p95 {current['p95_ms']}ms vs baseline {previous['p95_ms']}ms")
+        if previous['throughput'] and current['throughput'] < previous['throughput'] * (1 - tolerance):
+            regressions.append(
+                f"{endpoint}: throughput {current['throughput']}/s vs baseline {previous['throughput']}/s"
+            )
+    return regressions
+
+
+def load_baseline(path):
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_baseline(path, report):
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+        f.write('\n')
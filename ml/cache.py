@@ -0,0 +1,200 @@
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+
+class RecommendationCache:
+    """Per-customer cache of recommendation lists with LRU eviction and a TTL.
+
+    Entries are keyed by customer and top_n. By default they live in an
+    in-process LRU bounded to ``max_entries`` lists, however they are spread
+    over customers; when ``backend`` (a Django cache) is given they are
+    stored there instead so every worker shares them. Invalidation on the
+    shared backend bumps a per-customer generation number that is part of
+    the key, since Django caches cannot delete by prefix.
+    """
+
+    def __init__(self, max_entries=10000, ttl=60.0, backend=None, key_prefix='ml:recommendations'):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.backend = backend
+        self.key_prefix = key_prefix
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        # top_n values cached per customer, for invalidate()
+        self._customers = {}
+        self._lock = threading.Lock()
+
+    def get(self, customer_id, top_n):
+        """Return the cached recommendations or None"""
+        if self.backend is not None:
+            value = self.backend.get(self._backend_key(customer_id, top_n))
+        else:
+            value = self._get_local(customer_id, top_n)
+
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, customer_id, top_n, value):
+        if self.backend is not None:
+            self.backend.set(self._backend_key(customer_id, top_n), value, self.ttl)
+            return
+
+        now = time.monotonic()
+        with self._lock:
+            key = (customer_id, top_n)
+            self._entries[key] = (now + self.ttl, value)
+            self._entries.move_to_end(key)
+            self._customers.setdefault(customer_id, set()).add(top_n)
+
+            # Drop the least recently used lists, and any expired ones ahead of them
+            while self._entries:
+                oldest, (expires, _) = next(iter(self._entries.items()))
+                if len(self._entries) <= self.max_entries and expires >= now:
+                    break
+                self._remove(oldest)
+
+    def invalidate(self, customer_id):
+        """Drop every cached list of customer_id"""
+        if self.backend is not None:
+            key = self._generation_key(customer_id)
+            try:
+                self.backend.incr(key)
+            except ValueError:
+                self.backend.set(key, 1, None)
+            return
+
+        with self._lock:
+            for top_n in self._customers.pop(customer_id, ()):
+                del self._entries[(customer_id, top_n)]
+
+    def clear(self):
+        """Drop all cached recommendations held in this process"""
+        with self._lock:
+            self._entries.clear()
+            self._customers.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'entries': len(self._entries),
+            }
+
+    def _get_local(self, customer_id, top_n):
+        key = (customer_id, top_n)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def _remove(self, key):
+        """Drop one local entry; the caller holds the lock"""
+        del self._entries[key]
+        customer_id, top_n = key
+        top_ns = self._customers[customer_id]
+        top_ns.discard(top_n)
+        if not top_ns:
+            del self._customers[customer_id]
+
+    def _generation_key(self, customer_id):
+        return f'{self.key_prefix}:generation:{customer_id}'
+
+    def _backend_key(self, customer_id, top_n):
+        generation = self.backend.get(self._generation_key(customer_id), 0)
+        return f'{self.key_prefix}:{customer_id}:{generation}:{top_n}'
+
+
+class RankedPages:
+    """Short-lived rankings that cursor-paginated requests page through.
+
+    The first request of a session ranks a long list once and stores it
+    under a random token; the cursor of every following page names that
+    token and an offset, so "load more" slices the stored list instead of
+    scoring again. Each ranking records who it belongs to (customer and
+    query) and is only served to that owner. Like ``RecommendationCache``
+    it lives in a bounded in-process LRU unless a shared Django cache
+    ``backend`` is given.
+    """
+
+    def __init__(self, max_entries=1000, ttl=300.0, backend=None, key_prefix='ml:ranked'):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.backend = backend
+        self.key_prefix = key_prefix
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, owner, ranked):
+        """Store the ranked list of owner and return its token"""
+        token = secrets.token_urlsafe(9)
+        if self.backend is not None:
+            self.backend.set(f'{self.key_prefix}:{token}', (owner, ranked), self.ttl)
+            return token
+
+        with self._lock:
+            self._entries[token] = (time.monotonic() + self.ttl, owner, ranked)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return token
+
+    def get(self, owner, token):
+        """Return the ranked list stored under token for owner, or None"""
+        if self.backend is not None:
+            entry = self.backend.get(f'{self.key_prefix}:{token}')
+            if entry is None or entry[0] != owner:
+                return None
+            return entry[1]
+
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                return None
+            expires, entry_owner, ranked = entry
+            if expires < time.monotonic():
+                del self._entries[token]
+                return None
+            if entry_owner != owner:
+                return None
+            self._entries.move_to_end(token)
+            return ranked
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def make_cursor(token, offset):
+    """Encode the position of the next page"""
+    return f'{token}.{offset}'
+
+
+def parse_cursor(cursor, limit):
+    """Decode a cursor into (token, offset).
+
+    Raises ValueError if it is malformed or its offset is not below limit,
+    the length of the rankings cursors page through.
+    """
+    token, _, offset = cursor.rpartition('.')
+    try:
+        offset = int(offset)
+    except ValueError:
+        raise ValueError("Invalid cursor") from None
+    if not token or not 0 <= offset < limit:
+        raise ValueError("Invalid cursor")
+    return token, offset
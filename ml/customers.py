@@ -0,0 +1,102 @@
+import ast
+
+import numpy as np
+
+from .store import freeze
+
+
+def parse_list(value):
+    """Parse a "['A', 'B']" history cell into a list of names"""
+    try:
+        items = ast.literal_eval(value) if isinstance(value, str) else []
+    except (ValueError, SyntaxError):
+        return []
+    return [str(item) for item in items] if isinstance(items, (list, tuple)) else []
+
+
+def group_means(labels, feature_matrix):
+    """Return {label: mean feature vector} over the products carrying each label"""
+    names, codes = np.unique(labels, return_inverse=True)
+    sums = np.zeros((len(names), feature_matrix.shape[1]))
+    np.add.at(sums, codes, feature_matrix)
+    means = sums / np.bincount(codes, minlength=len(names))[:, None]
+    return {str(name): mean for name, mean in zip(names, means) if name}
+
+
+class CustomerStore:
+    """Read-only customer profiles keyed by Customer_ID.
+
+    Each customer's browsing history (categories) and purchase history
+    (subcategories) is turned into a unit profile vector in the product
+    feature space: the mean features of those categories and subcategories,
+    with purchases weighted like clicks and browsing like views. The
+    segment sets how much that static profile counts against live
+    interactions. Profiles are derived once at load time and looked up
+    through a hash index.
+    """
+
+    ARRAY_NAMES = ('customer_ids', 'profile_vectors', 'profile_weights', 'segments', 'avg_order_values')
+
+    # Weight of the CSV profile relative to live preferences, by segment
+    SEGMENT_WEIGHTS = {
+        'Frequent Buyer': 1.0,
+        'Occasional Shopper': 0.75,
+        'New Visitor': 0.5,
+    }
+    DEFAULT_SEGMENT_WEIGHT = 0.5
+
+    # Weights of purchased subcategories and browsed categories in a profile
+    PURCHASE_WEIGHT = 1.0
+    BROWSE_WEIGHT = 0.5
+
+    def __init__(self, arrays):
+        for name in self.ARRAY_NAMES:
+            setattr(self, name, freeze(arrays[name]))
+        self.customer_index = {str(customer_id): idx for idx, customer_id in enumerate(self.customer_ids)}
+
+    @classmethod
+    def from_frame(cls, customer_df, product_store):
+        """Derive the profiles from the customer CSV frame against a product store"""
+        customer_df = customer_df.drop_duplicates('Customer_ID')
+        features = product_store.feature_matrix
+        category_means = group_means(product_store.categories, features)
+        subcategory_means = group_means(product_store.subcategories, features)
+
+        profiles = np.zeros((len(customer_df), features.shape[1]))
+        for i, (browsed, purchased) in enumerate(zip(customer_df['Browsing_History'], customer_df['Purchase_History'])):
+            for category in parse_list(browsed):
+                if category in category_means:
+                    profiles[i] += cls.BROWSE_WEIGHT * category_means[category]
+            for subcategory in parse_list(purchased):
+                if subcategory in subcategory_means:
+                    profiles[i] += cls.PURCHASE_WEIGHT * subcategory_means[subcategory]
+
+        norms = np.linalg.norm(profiles, axis=1)
+        profiles[norms > 0] /= norms[norms > 0, None]
+
+        segments = customer_df['Customer_Segment'].fillna('').astype(str).to_numpy(dtype=str)
+        arrays = {
+            'customer_ids': customer_df['Customer_ID'].astype(str).to_numpy(dtype=str),
+            'profile_vectors': profiles.astype(np.float32),
+            'profile_weights': np.asarray(
+                [cls.SEGMENT_WEIGHTS.get(segment, cls.DEFAULT_SEGMENT_WEIGHT) for segment in segments],
+                dtype=np.float32
+            ),
+            'segments': segments,
+            'avg_order_values': customer_df['Avg_Order_Value'].to_numpy(dtype=np.float32, na_value=np.nan),
+        }
+        return cls(arrays)
+
+    def arrays(self):
+        """Return the named arrays that describe this store"""
+        return {name: getattr(self, name) for name in self.ARRAY_NAMES}
+
+    def __len__(self):
+        return len(self.customer_ids)
+
+    def lookup(self, customer_ids):
+        """Return the row of each customer ID, or -1 for unknown customers"""
+        return np.fromiter(
+            (self.customer_index.get(customer_id, -1) for customer_id in customer_ids),
+            dtype=np.intp, count=len(customer_ids)
+        )
@@ -0,0 +1,58 @@
+import atexit
+import threading
+
+from .threads import ProcessThread
+
+
+class LogConsumer:
+    """Background thread that folds new entries of an append-only log.
+
+    ``consume(batch_size)`` processes the next batch and returns how many
+    entries it handled. The thread calls it back to back while it keeps
+    returning full batches, then sleeps ``interval`` seconds. ``consume``
+    must claim its batch transactionally, since every worker process runs
+    a consumer over the same log.
+    """
+
+    def __init__(self, consume, batch_size=1000, interval=0.5):
+        self.consume = consume
+        self.batch_size = batch_size
+        self.interval = interval
+        self._stop = threading.Event()
+        self._worker = ProcessThread(self._run, 'ml-log-consumer')
+        atexit.register(self.close)
+
+    def start(self):
+        """Start the consumer thread of this process if it is not running"""
+        if not self._stop.is_set():
+            self._worker.start()
+
+    def drain(self):
+        """Consume batches until the log is caught up; return the number of entries"""
+        total = 0
+        while True:
+            try:
+                consumed = self.consume(self.batch_size)
+            except Exception as e:
+                print(f"Error consuming log: {str(e)}")
+                return total
+            total += consumed
+            if consumed < self.batch_size:
+                return total
+
+    def stop(self):
+        """Stop the consumer thread; the next start() starts a new one"""
+        self._stop.set()
+        self._worker.join()
+        self._stop.clear()
+
+    def close(self):
+        """Stop the consumer thread and fold whatever is still pending"""
+        started = self._worker.started()
+        self._stop.set()
+        if started:
+            self.drain()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.drain()
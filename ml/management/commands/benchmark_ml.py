@@ -0,0 +1,121 @@
+import asyncio
+import time
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from ml import benchmark
+
+class Command(BaseCommand):
+    help = ('Replay a request mix against the ml views on a synthetic catalog and report '
+            'latency percentiles, throughput and peak RSS')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=10000,
+                            help='Number of synthetic products')
+        parser.add_argument('--customers', type=int, default=10000,
+                            help='Number of synthetic customers')
+        parser.add_argument('--requests', type=int, default=5000,
+                            help='Number of requests in a generated workload')
+        parser.add_argument('--warmup', type=int, default=200,
+                            help='Requests sent before measuring')
+        parser.add_argument('--concurrency', type=int, default=8,
+                            help='Requests in flight at once')
+        parser.add_argument('--seed', type=int, default=0,
+                            help='Seed of the catalog and workload generators')
+        parser.add_argument('--workload',
+                            help='Replay this JSON-lines workload instead of generating one')
+        parser.add_argument('--write-workload',
+                            help='Write the generated workload to this file')
+        parser.add_argument('--data-dir',
+                            help='Keep the synthetic CSV files and feedback database here '
+                                 '(a temporary directory by default)')
+        parser.add_argument('--orm-users', type=int, default=0,
+                            help='Also time the hybrid Recommender for this many users of the Django database')
+        parser.add_argument('--baseline',
+                            help='Compare against this baseline file and fail on regressions')
+        parser.add_argument('--save-baseline',
+                            help='Write the report to this baseline file')
+        parser.add_argument('--tolerance', type=float, default=0.2,
+                            help='Allowed p95 and throughput change relative to the baseline')
+
+    def handle(self, *args, **options):
+        # Every write of the run goes to a fresh feedback database
+        start = time.perf_counter()
+        with benchmark.synthetic_dataset(
+            options['products'], options['customers'], options['seed'], options['data_dir']
+        ) as (product_df, customer_df):
+            load_seconds = time.perf_counter() - start
+            self.stdout.write(
+                f'Built {len(product_df)} products, {len(customer_df)} customers in {load_seconds:.2f}s'
+            )
+            report = self.run(product_df, customer_df, options)
+        report['load_seconds'] = round(load_seconds, 3)
+
+        self.print_report(report)
+        for request_id, status in report['errors'][:10]:
+            self.stdout.write(self.style.WARNING(f'{request_id}: unexpected status {status}'))
+
+        if options['save_baseline']:
+            benchmark.save_baseline(options['save_baseline'], report)
+            self.stdout.write(f'Saved baseline to {options["save_baseline"]}')
+
+        if options['baseline']:
+            baseline = benchmark.load_baseline(options['baseline'])
+            if baseline is None:
+                raise CommandError(f'Baseline {options["baseline"]} not found')
+            regressions = benchmark.compare(report, baseline, options['tolerance'])
+            if regressions:
+                raise CommandError('Regressions against baseline:\n' + '\n'.join(regressions))
+            self.stdout.write(self.style.SUCCESS('No regressions against baseline'))
+
+    def run(self, product_df, customer_df, options):
+        if options['workload']:
+            workload = benchmark.read_workload(options['workload'])
+        else:
+            workload = benchmark.generate_workload(product_df, customer_df, options['requests'], seed=options['seed'])
+            if options['write_workload']:
+                benchmark.write_workload(options['write_workload'], workload)
+
+        warmup = benchmark.generate_workload(product_df, customer_df, options['warmup'], seed=options['seed'] + 1)
+        asyncio.run(benchmark.replay(warmup, options['concurrency']))
+
+        latencies, errors, elapsed = asyncio.run(benchmark.replay(workload, options['concurrency']))
+        endpoints = {endpoint: benchmark.summarize(values, elapsed) for endpoint, values in latencies.items()}
+        endpoints['all'] = benchmark.summarize([value for values in latencies.values() for value in values], elapsed)
+
+        if options['orm_users']:
+            endpoints['orm_recommender'] = self.time_recommender(options['orm_users'])
+
+        return {
+            'products': len(product_df),
+            'customers': len(customer_df),
+            'requests': len(workload),
+            'concurrency': options['concurrency'],
+            'errors': errors,
+            'peak_rss_mb': benchmark.peak_rss_mb(),
+            'endpoints': endpoints,
+        }
+
+    def time_recommender(self, users):
+        """Time Recommender.generate_recommendations for the first users of the Django database"""
+        from recommendations.recommender import Recommender
+
+        user_ids = list(get_user_model().objects.order_by('id').values_list('id', flat=True)[:users])
+        if not user_ids:
+            self.stdout.write(self.style.WARNING('No users in the Django database; skipping the ORM recommender'))
+            return benchmark.summarize([], 0)
+        recommender = Recommender()
+        start = time.perf_counter()
+        latencies = benchmark.time_calls(recommender.generate_recommendations, [(user_id,) for user_id in user_ids])
+        return benchmark.summarize(latencies, time.perf_counter() - start)
+
+    def print_report(self, report):
+        self.stdout.write(
+            f'{report["requests"]} requests at concurrency {report["concurrency"]}, '
+            f'{len(report["errors"])} errors, peak RSS {report["peak_rss_mb"]} MB'
+        )
+        self.stdout.write(f'{"endpoint":<16}{"count":>8}{"req/s":>10}{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}')
+        for endpoint, summary in sorted(report['endpoints'].items()):
+            self.stdout.write(
+                f'{endpoint:<16}{summary["count"]:>8}{summary["throughput"]:>10}'
+                f'{summary["p50_ms"]:>10}{summary["p95_ms"]:>10}{summary["p99_ms"]:>10}'
+            )
@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from ml.app import build_data, source_files
+from ml.snapshot import save_snapshot
+
+class Command(BaseCommand):
+    help = 'Write the binary product and customer snapshot that ML workers memory-map at startup'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default=settings.ML_SNAPSHOT_DIR,
+                            help='Directory the snapshot versions are written to')
+        parser.add_argument('--keep', type=int, default=2,
+                            help='Number of snapshot versions kept on disk')
+
+    def handle(self, *args, **options):
+        # Stamp the sources before reading them so a concurrent edit invalidates the snapshot
+        sources = source_files()
+        product_store, customer_store = build_data()
+        self.stdout.write(f'Catalog: {len(product_store)} products, {len(customer_store)} customers')
+
+        version = save_snapshot(options['output'], product_store, customer_store, sources, keep=options['keep'])
+
+        self.stdout.write(self.style.SUCCESS(f'Built ML snapshot {version} in {options["output"]}'))
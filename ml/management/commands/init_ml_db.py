@@ -0,0 +1,10 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from ml.app import create_schema
+
+class Command(BaseCommand):
+    help = 'Create or upgrade the tables and indexes of the ML feedback database'
+
+    def handle(self, *args, **options):
+        create_schema()
+        self.stdout.write(self.style.SUCCESS(f'ML feedback database ready at {settings.ML_DB_PATH}'))
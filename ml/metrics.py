@@ -0,0 +1,148 @@
+import bisect
+import contextvars
+import functools
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds, in seconds, of the latency histogram buckets
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# HELP text of every metric family, also fixing the order they are rendered in
+METRIC_HELP = {
+    'ml_stage_duration_seconds': ('histogram', 'Time spent in each stage of the recommendation pipeline'),
+    'ml_db_queries_total': ('counter', 'Database round trips made by the recommendation pipeline'),
+    'ml_db_rows_total': ('counter', 'Rows read from the database by the recommendation pipeline'),
+    'ml_products_scored_total': ('counter', 'Customer x product scores computed'),
+    'ml_recommendation_cache_lookups_total': ('counter', 'Recommendation cache lookups by result'),
+    'ml_recommendation_cache_entries': ('gauge', 'Recommendation lists held in the in-process cache'),
+}
+
+# Stage durations of the current request, set by collect_timings()
+_request_timings = contextvars.ContextVar('ml_request_timings', default=None)
+
+
+class Histogram:
+    """Cumulative bucket counts, sum and count of observed values"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metrics:
+    """Process-local latency histograms and counters in Prometheus text format.
+
+    Every process keeps its own values, so with several workers each scrape
+    reports the worker that served it.
+    """
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self._histograms = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name, value, **labels):
+        """Record value in the histogram name{labels}"""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(self.buckets)
+            histogram.observe(value)
+
+    def inc(self, name, value=1, **labels):
+        """Add value to the counter name{labels}"""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        """Set name{labels} to value, for values sampled at scrape time"""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = value
+
+    @contextmanager
+    def stage(self, name):
+        """Time the enclosed block as a pipeline stage"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.observe('ml_stage_duration_seconds', elapsed, stage=name)
+            timings = _request_timings.get()
+            if timings is not None:
+                timings[name] = timings.get(name, 0.0) + elapsed
+
+    def timed(self, name):
+        """Decorator timing every call of the function as a pipeline stage"""
+        def decorator(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.stage(name):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def count_query(self, query, rows):
+        """Count one database round trip returning rows rows"""
+        self.inc('ml_db_queries_total', query=query)
+        self.inc('ml_db_rows_total', rows, query=query)
+
+    def render(self):
+        """Return every metric in the Prometheus text exposition format"""
+        with self._lock:
+            histograms = {key: (list(h.counts), h.sum, h.count) for key, h in self._histograms.items()}
+            counters = dict(self._counters)
+
+        lines = []
+        for family, (kind, help_text) in METRIC_HELP.items():
+            lines.append(f'# HELP {family} {help_text}')
+            lines.append(f'# TYPE {family} {kind}')
+            for (name, labels), (counts, total, count) in sorted(histograms.items()):
+                if name != family:
+                    continue
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + ('+Inf',), counts):
+                    cumulative += bucket_count
+                    lines.append(f'{name}_bucket{format_labels(labels + (("le", str(bound)),))} {cumulative}')
+                lines.append(f'{name}_sum{format_labels(labels)} {total}')
+                lines.append(f'{name}_count{format_labels(labels)} {count}')
+            for (name, labels), value in sorted(counters.items()):
+                if name == family:
+                    lines.append(f'{name}{format_labels(labels)} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{value}"' for key, value in labels) + '}'
+
+
+@contextmanager
+def collect_timings():
+    """Collect the stage durations of the enclosed block into the yielded dict.
+
+    Code run through a copy of the current context (such as the ML worker
+    pool) adds to the same dict.
+    """
+    timings = {}
+    token = _request_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _request_timings.reset(token)
+
+
+metrics = Metrics()
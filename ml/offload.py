@@ -0,0 +1,94 @@
+import asyncio
+import atexit
+import contextvars
+import functools
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from .threads import ProcessThread
+
+
+class WorkerPool:
+    """Bounded thread pool that runs blocking ML calls for async views.
+
+    Scoring spends most of its time in NumPy, which releases the GIL, so a
+    few threads keep the event loop free while requests are scored. The
+    executor is created per process because threads do not survive a fork.
+    """
+
+    def __init__(self, max_workers=4):
+        self.max_workers = max_workers
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    async def run(self, fn, *args, **kwargs):
+        """Run fn(*args, **kwargs) on the pool and return its result"""
+        loop = asyncio.get_running_loop()
+        # Run in a copy of the caller's context so request-scoped state
+        # such as the Server-Timing collector reaches the worker thread
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(self._get_executor(), functools.partial(context.run, fn, *args, **kwargs))
+
+    def _get_executor(self):
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix='ml-worker')
+                    self._pid = os.getpid()
+        return self._executor
+
+
+class FeedbackQueue:
+    """Bounded queue of feedback writes applied in order by one background thread.
+
+    Views enqueue the write and respond immediately; ``submit`` never
+    blocks and returns False when the queue is full so the caller can
+    apply the write itself. Whatever is still queued is applied at
+    interpreter exit.
+    """
+
+    def __init__(self, max_pending=10000):
+        self._queue = queue.Queue(max_pending)
+        self._worker = ProcessThread(self._run, 'ml-feedback')
+        atexit.register(self.close)
+
+    def submit(self, fn, *args):
+        """Queue fn(*args); return False if the queue is full"""
+        self._worker.start()
+        try:
+            self._queue.put_nowait((fn, args))
+        except queue.Full:
+            return False
+        return True
+
+    def drain(self):
+        """Apply every queued write in the calling thread"""
+        while True:
+            try:
+                fn, args = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            self._apply(fn, args)
+
+    def join(self):
+        """Wait until every queued write has been applied"""
+        self._queue.join()
+
+    def close(self):
+        self.drain()
+
+    def _apply(self, fn, args):
+        try:
+            fn(*args)
+        except Exception as e:
+            print(f"Error applying feedback: {str(e)}")
+        finally:
+            self._queue.task_done()
+
+    def _run(self):
+        while True:
+            fn, args = self._queue.get()
+            self._apply(fn, args)
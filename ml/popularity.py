@@ -0,0 +1,50 @@
+import threading
+
+import numpy as np
+
+
+class PopularityCounters:
+    """Resident view and click counters aligned to a ProductStore's rows.
+
+    Seeded from the product_popularity table and incremented by the write
+    path, so scoring never has to read the table. Counts for product IDs
+    that are not in the catalog are ignored.
+    """
+
+    def __init__(self, product_index):
+        self.product_index = product_index
+        self.views = np.zeros(len(product_index), dtype=np.int64)
+        self.clicks = np.zeros(len(product_index), dtype=np.int64)
+        self.max_clicks = 0
+        self._lock = threading.Lock()
+
+    def load(self, rows):
+        """Replace the counters with (product_id, view_count, click_count) rows"""
+        views = np.zeros_like(self.views)
+        clicks = np.zeros_like(self.clicks)
+        for product_id, view_count, click_count in rows:
+            idx = self.product_index.get(product_id)
+            if idx is not None:
+                views[idx] += view_count or 0
+                clicks[idx] += click_count or 0
+
+        with self._lock:
+            self.views = views
+            self.clicks = clicks
+            self.max_clicks = int(clicks.max(initial=0))
+
+    def add(self, product_id, views=0, clicks=0):
+        """Increment the counters of product_id"""
+        idx = self.product_index.get(product_id)
+        if idx is None:
+            return
+        with self._lock:
+            self.views[idx] += views
+            self.clicks[idx] += clicks
+            if self.clicks[idx] > self.max_clicks:
+                self.max_clicks = int(self.clicks[idx])
+
+    def click_boost(self, max_boost=0.2):
+        """Per-row score multiplier: 1 plus up to max_boost for the most clicked product"""
+        clicks = self.clicks
+        return 1 + clicks.astype(np.float32) * np.float32(max_boost / (self.max_clicks or 1))
@@ -0,0 +1,173 @@
+import bisect
+import threading
+from collections import OrderedDict, defaultdict
+
+import numpy as np
+
+
+def edit_distance(a, b, limit):
+    """Levenshtein distance between a and b, or limit + 1 once it exceeds limit"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, char in enumerate(a, 1):
+        current = [i]
+        for j, other in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char != other)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+def trigrams(term):
+    """Return the padded character trigrams of term"""
+    padded = f'  {term} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class SearchIndex:
+    """Top-K product search over a ProductStore's inverted indexes.
+
+    Product and query TF-IDF vectors are L2-normalized, so the cosine
+    similarity of a product is the sum of query weight times posting weight
+    over the query terms. Only the postings of those terms, and the rows of
+    groups the customer has a preference for, are visited; every other
+    product scores zero. Analyzed queries are kept in an LRU cache.
+
+    Query words that are not in the vocabulary are expanded to the terms
+    they are a prefix of or, failing that, to the closest terms found
+    through a trigram index. Autocomplete suggestions come from a sorted
+    array of every word-boundary suffix of the brand, category and
+    subcategory names, so a prefix lookup is a binary search.
+    """
+
+    # Fields offered as autocomplete suggestions
+    SUGGESTION_FIELDS = (('Brand', 'brands'), ('Category', 'categories'), ('Subcategory', 'subcategories'))
+    # Most vocabulary terms a single query word expands to
+    MAX_EXPANSIONS = 5
+
+    def __init__(self, product_store, cache_size=4096):
+        self.store = product_store
+        self.cache_size = cache_size
+        self._queries = OrderedDict()
+        self._lock = threading.Lock()
+        self._analyze = product_store.tfidf.build_analyzer()
+
+        # Vocabulary terms in sorted order for prefix ranges, and trigram
+        # posting lists for typo-tolerant lookups
+        self.terms = sorted(product_store.tfidf.vocabulary_)
+        self.term_trigrams = defaultdict(list)
+        for term in self.terms:
+            for gram in trigrams(term):
+                self.term_trigrams[gram].append(term)
+
+        # Suggestions as (text, field, product count), ranked by count
+        suggestions = []
+        for field, attribute in self.SUGGESTION_FIELDS:
+            values, counts = np.unique(getattr(product_store, attribute), return_counts=True)
+            suggestions.extend(
+                (str(value), field, int(count)) for value, count in zip(values, counts) if value
+            )
+        suggestions.sort(key=lambda suggestion: (-suggestion[2], suggestion[0]))
+        self.suggestions = suggestions
+
+        keys = []
+        for rank, (text, _, _) in enumerate(suggestions):
+            words = text.lower().split()
+            for start in range(len(words)):
+                keys.append((' '.join(words[start:]), rank))
+        keys.sort()
+        self.suggestion_keys = [key for key, _ in keys]
+        self.suggestion_ranks = [rank for _, rank in keys]
+
+    def query_vector(self, query):
+        """Return the (term ids, weights) of the normalized query vector"""
+        with self._lock:
+            vector = self._queries.get(query)
+            if vector is not None:
+                self._queries.move_to_end(query)
+                return vector
+
+        terms = []
+        for word in self._analyze(query):
+            terms.extend(self.expand_term(word))
+        row = self.store.tfidf.transform([' '.join(terms)])
+        vector = (row.indices.astype(np.intp), row.data.astype(np.float32))
+        with self._lock:
+            self._queries[query] = vector
+            while len(self._queries) > self.cache_size:
+                self._queries.popitem(last=False)
+        return vector
+
+    def text_matches(self, query):
+        """Return the rows matching query and their text similarity, ordered by row"""
+        store = self.store
+        terms, weights = self.query_vector(query)
+        starts = store.posting_indptr[terms]
+        ends = store.posting_indptr[terms + 1]
+        if not len(terms) or not (ends - starts).any():
+            return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.float32)
+
+        rows = np.concatenate([store.posting_rows[start:end] for start, end in zip(starts, ends)])
+        contributions = np.concatenate([
+            store.posting_weights[start:end] * weight
+            for start, end, weight in zip(starts, ends, weights)
+        ])
+        matches, positions = np.unique(rows, return_inverse=True)
+        similarity = np.bincount(positions, weights=contributions, minlength=len(matches))
+        return matches, similarity.astype(np.float32)
+
+    def group_members(self, codes):
+        """Return the rows of the products in the given groups"""
+        store = self.store
+        if not len(codes):
+            return np.empty(0, dtype=np.intp)
+        return np.concatenate([
+            store.group_rows[store.group_indptr[code]:store.group_indptr[code + 1]]
+            for code in codes
+        ])
+
+    def expand_term(self, word):
+        """Map a query word to vocabulary terms: itself, its completions or its closest spellings"""
+        if word in self.store.tfidf.vocabulary_:
+            return [word]
+
+        start = bisect.bisect_left(self.terms, word)
+        completions = []
+        for term in self.terms[start:start + self.MAX_EXPANSIONS]:
+            if not term.startswith(word):
+                break
+            completions.append(term)
+        if completions:
+            return completions
+
+        # One typo allowed in short words, two in longer ones
+        limit = 1 if len(word) <= 4 else 2
+        candidates = set()
+        for gram in trigrams(word):
+            candidates.update(self.term_trigrams.get(gram, ()))
+        distances = sorted((edit_distance(word, term, limit), term) for term in candidates)
+        best = [term for distance, term in distances if distance <= limit and distance == distances[0][0]]
+        return best[:self.MAX_EXPANSIONS]
+
+    def suggest(self, prefix, limit=10):
+        """Return up to limit (text, field, product count) suggestions completing prefix"""
+        prefix = ' '.join(prefix.lower().split())
+        if not prefix:
+            return []
+
+        keys = self.suggestion_keys
+        ranks = set()
+        position = bisect.bisect_left(keys, prefix)
+        while position < len(keys) and keys[position].startswith(prefix):
+            ranks.add(self.suggestion_ranks[position])
+            position += 1
+
+        if not ranks:
+            # Retry with the last word corrected to its closest term
+            words = prefix.split()
+            corrected = self.expand_term(words[-1])
+            if corrected and corrected[0] != words[-1]:
+                return self.suggest(' '.join(words[:-1] + corrected[:1]), limit)
+        return [self.suggestions[rank] for rank in sorted(ranks)[:limit]]
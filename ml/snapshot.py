@@ -0,0 +1,90 @@
+import json
+import os
+import pickle
+
+import numpy as np
+
+from .customers import CustomerStore
+from .store import ProductStore
+from .versions import META_FILE, current_version, new_version, publish_version
+
+# Bumped whenever the snapshot layout or the store arrays change
+SNAPSHOT_FORMAT = 3
+
+TFIDF_FILE = 'tfidf.pkl'
+PRODUCTS_DIR = 'products'
+CUSTOMERS_DIR = 'customers'
+
+
+def source_stamp(paths):
+    """Identify the source files by path, size and modification time"""
+    stamp = []
+    for path in paths:
+        stat = os.stat(path)
+        stamp.append([os.path.abspath(path), stat.st_size, stat.st_mtime_ns])
+    return stamp
+
+
+def save_snapshot(directory, product_store, customer_store, sources, keep=2):
+    """Write the product and customer stores as a new snapshot version and make it current.
+
+    Every array is a separate ``.npy`` file so loaders can memory-map it;
+    text columns are stored as fixed-width unicode arrays. Only the newest
+    ``keep`` versions are kept.
+    """
+    version, version_dir = new_version(directory)
+    for subdirectory, store in ((PRODUCTS_DIR, product_store), (CUSTOMERS_DIR, customer_store)):
+        os.makedirs(os.path.join(version_dir, subdirectory))
+        for name, array in store.arrays().items():
+            np.save(os.path.join(version_dir, subdirectory, f'{name}.npy'), np.ascontiguousarray(array))
+
+    with open(os.path.join(version_dir, TFIDF_FILE), 'wb') as f:
+        pickle.dump(product_store.tfidf, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    with open(os.path.join(version_dir, META_FILE), 'w') as f:
+        json.dump({
+            'format': SNAPSHOT_FORMAT,
+            'version': version,
+            'sources': sources,
+            'features': product_store.features,
+        }, f, indent=2)
+
+    publish_version(directory, version, keep)
+    return version
+
+
+def load_snapshot(directory, sources=None):
+    """Memory-map the current snapshot under directory.
+
+    Returns ``(product_store, customer_store, version)``, or None when there is
+    no snapshot, it was written by another format, or ``sources`` is given
+    and does not match the stamp of the files it was built from.
+    """
+    version = current_version(directory)
+    if version is None:
+        return None
+    version_dir = os.path.join(directory, version)
+    try:
+        with open(os.path.join(version_dir, META_FILE)) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if meta.get('format') != SNAPSHOT_FORMAT:
+        return None
+    if sources is not None and meta.get('sources') != sources:
+        return None
+
+    arrays = {
+        name: np.load(os.path.join(version_dir, PRODUCTS_DIR, f'{name}.npy'), mmap_mode='r')
+        for name in ProductStore.ARRAY_NAMES
+    }
+    with open(os.path.join(version_dir, TFIDF_FILE), 'rb') as f:
+        tfidf = pickle.load(f)
+    product_store = ProductStore(arrays, meta['features'], tfidf)
+
+    customer_store = CustomerStore({
+        name: np.load(os.path.join(version_dir, CUSTOMERS_DIR, f'{name}.npy'), mmap_mode='r')
+        for name in CustomerStore.ARRAY_NAMES
+    })
+    return product_store, customer_store, version
@@ -2,6 +2,10 @@
 const urlParams = new URLSearchParams(window.location.search);
 const customerId = urlParams.get('customer_id');
 
+// Cursor of the next page of recommendations, null once all are shown
+let nextRecommendationsCursor = null;
+let loadingRecommendations = false;
+
 // Track user interactions
 let interactionHistory = {
     views: new Set(),
@@ -17,6 +21,14 @@ document.addEventListener('DOMContentLoaded', () => {
     const searchInput = document.getElementById('searchInput');
     searchInput.addEventListener('input', handleSearch);
     
+    // Load more recommendations when scrolling near the bottom of the page
+    window.addEventListener('scroll', () => {
+        const nearBottom = window.innerHeight + window.scrollY >= document.body.offsetHeight - 300;
+        if (nearBottom && nextRecommendationsCursor && !loadingRecommendations) {
+            loadRecommendations(nextRecommendationsCursor);
+        }
+    });
+    
     // Setup logout button
     document.getElementById('logoutBtn').addEventListener('click', () => {
         window.location.href = '/';
@@ -61,16 +73,21 @@ function displayUserPreferences(preferences) {
     });
 }
 
-// Load and display recommendations
-async function loadRecommendations() {
+// Load and display a page of recommendations; with a cursor the page is
+// appended to the ones already shown
+async function loadRecommendations(cursor = null) {
+    loadingRecommendations = true;
     try {
-        const response = await fetch(`/recommend/${customerId}`);
+        const params = new URLSearchParams({ top_n: 20 });
+        if (cursor) params.set('cursor', cursor);
+        const response = await fetch(`/recommend/${customerId}?${params}`);
         if (!response.ok) {
             const errorData = await response.json();
             throw new Error(errorData.error || 'Failed to load recommendations');
         }
         const recommendations = await response.json();
-        displayRecommendations(recommendations);
+        nextRecommendationsCursor = response.headers.get('X-Next-Cursor');
+        displayRecommendations(recommendations, Boolean(cursor));
         
         // Track view interactions
         recommendations.forEach(product => {
@@ -90,17 +107,19 @@ async function loadRecommendations() {
                 </div>
             `;
         }
+    } finally {
+        loadingRecommendations = false;
     }
 }
 
-function displayRecommendations(recommendations) {
+function displayRecommendations(recommendations, append = false) {
     const grid = document.getElementById('recommendationsGrid');
     if (!grid) return;
     
-    // Sort recommendations by final score in descending order
-    recommendations.sort((a, b) => b.Final_Score - a.Final_Score);
-    
-    grid.innerHTML = '';
+    // Pages arrive ranked by final score, best first
+    if (!append) {
+        grid.innerHTML = '';
+    }
     
     recommendations.forEach(product => {
         const card = document.createElement('div');
@@ -145,6 +164,9 @@ async function handleSearch(e) {
         return;
     }
 
+    // Suggestions come back much faster than full search results
+    loadSuggestions(query);
+
     try {
         const response = await fetch(`/search/${customerId}?query=${encodeURIComponent(query)}`);
         if (!response.ok) throw new Error('Failed to search');
@@ -155,6 +177,25 @@ async function handleSearch(e) {
     }
 }
 
+async function loadSuggestions(query) {
+    try {
+        const response = await fetch(`/autocomplete?query=${encodeURIComponent(query)}`);
+        if (!response.ok) throw new Error('Failed to load suggestions');
+        const suggestions = await response.json();
+        const datalist = document.getElementById('searchSuggestions');
+        if (!datalist) return;
+        datalist.innerHTML = '';
+        suggestions.forEach(suggestion => {
+            const option = document.createElement('option');
+            option.value = suggestion.Suggestion;
+            option.label = `${suggestion.Field} (${suggestion.Product_Count})`;
+            datalist.appendChild(option);
+        });
+    } catch (error) {
+        console.error('Error loading suggestions:', error);
+    }
+}
+
 function displaySearchResults(results) {
     const searchResults = document.getElementById('searchResults');
     if (!searchResults) return;
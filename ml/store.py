@@ -0,0 +1,175 @@
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+
+def freeze(array):
+    """Mark a NumPy array read-only and return it"""
+    if array.flags.writeable:
+        array.setflags(write=False)
+    return array
+
+
+class ProductStore:
+    """Immutable product catalog shared by every request.
+
+    All arrays are contiguous and read-only. Scoring functions take a
+    reference to the store once per request and compute into their own
+    buffers, so a reload only has to swap the ``store`` reference in
+    ``ml.app`` and in-flight requests keep a consistent snapshot. The arrays
+    can be written to and memory-mapped from a snapshot (see ``ml.snapshot``)
+    via ``arrays`` and the constructor.
+    """
+
+    # Arrays that fully describe a store
+    ARRAY_NAMES = (
+        'product_ids', 'brands', 'categories', 'subcategories',
+        'feature_matrix', 'feature_norms', 'quality_scores',
+        'group_codes', 'group_means', 'group_categories', 'group_subcategories',
+        'tfidf_data', 'tfidf_indices', 'tfidf_indptr',
+        'posting_weights', 'posting_rows', 'posting_indptr',
+        'group_rows', 'group_indptr',
+    )
+
+    # Display fields of a result record and the array each is read from
+    RECORD_COLUMNS = (
+        ('Product_ID', 'product_ids'),
+        ('Brand', 'brands'),
+        ('Category', 'categories'),
+        ('Subcategory', 'subcategories'),
+    )
+
+    def __init__(self, arrays, features, tfidf):
+        self.features = list(features)
+        self.tfidf = tfidf
+
+        for name in self.ARRAY_NAMES:
+            setattr(self, name, freeze(arrays[name]))
+        self.tfidf_matrix = sparse.csr_matrix(
+            (self.tfidf_data, self.tfidf_indices, self.tfidf_indptr),
+            shape=(len(self.product_ids), len(tfidf.vocabulary_)),
+            copy=False
+        )
+
+        # Index products by ID so lookups don't scan the catalog
+        self.product_index = {str(product_id): idx for idx, product_id in enumerate(self.product_ids)}
+        self.group_index = {
+            (str(category), str(subcategory)): code
+            for code, (category, subcategory) in enumerate(zip(self.group_categories, self.group_subcategories))
+        }
+
+    @classmethod
+    def from_frame(cls, product_df, features, quality_weights):
+        """Derive every array from a catalog frame whose feature columns are already scaled"""
+        display = {
+            column: product_df[column].fillna('').astype(str).to_numpy(dtype=str)
+            for column in ('Product_ID', 'Brand', 'Category', 'Subcategory')
+        }
+
+        feature_matrix = np.ascontiguousarray(product_df[list(features)].to_numpy(dtype=np.float32))
+        norms = np.linalg.norm(feature_matrix, axis=1)
+        norms[norms == 0] = 1.0
+
+        # Encode each product's (Category, Subcategory) pair as an integer group
+        # code, with the mean feature vector of every group, so preference
+        # weighting is a gather over codes instead of string comparisons
+        pairs = pd.MultiIndex.from_arrays([product_df['Category'], product_df['Subcategory']])
+        codes, groups = pd.factorize(pairs)
+        # Products with a missing category share a trailing group no preference matches
+        codes[codes < 0] = len(groups)
+        sizes = np.bincount(codes, minlength=len(groups) + 1)
+        sums = np.zeros((len(groups) + 1, len(features)), dtype=np.float64)
+        np.add.at(sums, codes, feature_matrix)
+
+        # Text representation for search
+        text = [' '.join(parts) for parts in zip(display['Brand'], display['Category'], display['Subcategory'])]
+        tfidf = TfidfVectorizer(stop_words='english')
+        tfidf_matrix = tfidf.fit_transform(text).astype(np.float32).tocsr()
+
+        # Inverted indexes for search: the rows of every term (the TF-IDF
+        # matrix in column order) and the rows of every group
+        postings = tfidf_matrix.tocsc()
+        postings.sort_indices()
+
+        arrays = {
+            'product_ids': display['Product_ID'],
+            'brands': display['Brand'],
+            'categories': display['Category'],
+            'subcategories': display['Subcategory'],
+            'feature_matrix': feature_matrix,
+            'feature_norms': norms,
+            # Query-independent part of the final score
+            'quality_scores': feature_matrix @ np.asarray(quality_weights, dtype=np.float32),
+            'group_codes': codes.astype(np.intp),
+            'group_means': (sums / np.maximum(sizes, 1)[:, None]).astype(np.float32),
+            'group_categories': np.asarray([category for category, _ in groups], dtype=str),
+            'group_subcategories': np.asarray([subcategory for _, subcategory in groups], dtype=str),
+            'tfidf_data': tfidf_matrix.data,
+            'tfidf_indices': tfidf_matrix.indices,
+            'tfidf_indptr': tfidf_matrix.indptr,
+            'posting_weights': postings.data,
+            'posting_rows': postings.indices,
+            'posting_indptr': postings.indptr,
+            'group_rows': np.argsort(codes, kind='stable').astype(np.intp),
+            'group_indptr': np.concatenate(([0], np.cumsum(sizes))).astype(np.intp),
+        }
+        return cls(arrays, features, tfidf)
+
+    def arrays(self):
+        """Return the named arrays that describe this store"""
+        return {name: getattr(self, name) for name in self.ARRAY_NAMES}
+
+    def __len__(self):
+        return len(self.product_ids)
+
+    def records(self, rows, scores):
+        """Build one result dict per row, reading whole columns at a time.
+
+        ``scores`` maps each score field to an array aligned with ``rows``.
+        Columns are gathered by position and converted to Python values in
+        one ``tolist()`` call each instead of boxing every cell.
+        """
+        rows = np.asarray(rows, dtype=np.intp)
+        columns = {name: getattr(self, attribute)[rows].tolist() for name, attribute in self.RECORD_COLUMNS}
+        for name, values in scores.items():
+            columns[name] = np.asarray(values, dtype=np.float64).tolist()
+        names = list(columns)
+        return [dict(zip(names, values)) for values in zip(*columns.values())]
+
+    def preference_groups(self, preferences):
+        """Map preference rows to (group codes, scores) arrays, skipping unknown pairs"""
+        codes = []
+        scores = []
+        for pref in preferences:
+            code = self.group_index.get((pref['category'], pref['subcategory']))
+            if code is not None:
+                codes.append(code)
+                scores.append(pref['preference_score'])
+        return np.asarray(codes, dtype=np.intp), np.asarray(scores, dtype=np.float64)
+
+
+class Ranking:
+    """Ranked catalog rows and their scores, kept between requests.
+
+    Rows are int32 positions in the store and scores float32 columns, so a
+    ranking of a few hundred products takes a few KB where its result
+    dicts would take a hundred; ``records`` builds the dicts of just the
+    slice being served. ``version`` identifies the catalog the rows index.
+    """
+
+    __slots__ = ('version', 'rows', 'scores')
+
+    def __init__(self, version, rows, scores):
+        self.version = version
+        self.rows = np.asarray(rows, dtype=np.int32)
+        self.scores = {name: np.asarray(values, dtype=np.float32) for name, values in scores.items()}
+
+    def __len__(self):
+        return len(self.rows)
+
+    def records(self, product_store, start=0, stop=None):
+        """Build the result dicts of the ranked rows from start to stop"""
+        return product_store.records(
+            self.rows[start:stop], {name: values[start:stop] for name, values in self.scores.items()}
+        )
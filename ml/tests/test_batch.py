@@ -0,0 +1,68 @@
+import json
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from ml import app, benchmark
+
+
+@override_settings(ML_BATCH_API_TOKEN='secret-token', ML_BATCH_MAX_CUSTOMERS=3)
+class RecommendBatchTests(SimpleTestCase):
+    def post(self, payload, token='secret-token'):
+        headers = {'Authorization': f'Bearer {token}'} if token else {}
+        return self.client.post(
+            '/ml/recommend/batch/', json.dumps(payload), content_type='application/json', secure=True,
+            headers=headers
+        )
+
+    def test_requires_the_api_token(self):
+        for token in [None, 'wrong-token']:
+            with self.subTest(token=token):
+                response = self.post({'customer_ids': ['C0']}, token=token)
+                self.assertEqual(response.status_code, 403)
+
+    @override_settings(ML_BATCH_API_TOKEN=None)
+    def test_disabled_without_a_configured_token(self):
+        response = self.post({'customer_ids': ['C0']}, token='None')
+        self.assertEqual(response.status_code, 403)
+
+    def test_rejects_invalid_requests(self):
+        for payload in [
+            {'customer_ids': 'C0'},
+            {'customer_ids': [['C0']]},
+            {'customer_ids': [True]},
+            {'customer_ids': ['C0'], 'top_n': 0},
+            {'customer_ids': ['C0'], 'top_n': 'five'},
+            {'customer_ids': ['C0', 'C1', 'C2', 'C3']},
+        ]:
+            with self.subTest(payload=payload):
+                self.assertEqual(self.post(payload).status_code, 400)
+
+    def test_scores_every_customer(self):
+        with benchmark.synthetic_dataset(50, 10):
+            response = self.post({'customer_ids': ['C0', 'C1', 7], 'top_n': 3})
+
+        self.assertEqual(response.status_code, 200)
+        results = response.json()
+        self.assertEqual(set(results), {'C0', 'C1', '7'})
+        self.assertEqual(len(results['C0']), 3)
+
+
+class ScoringChunkTests(SimpleTestCase):
+    def test_chunk_size_follows_the_memory_budget(self):
+        with mock.patch.object(app, 'SCORING_MEMORY_BUDGET', 64 * 1024 * 1024):
+            self.assertEqual(app.scoring_chunk_size(100000), 33)
+            self.assertEqual(app.scoring_chunk_size(10 ** 9), 1)
+
+    def test_chunks_score_like_a_single_pass(self):
+        customer_ids = [f'C{i}' for i in range(12)]
+        with benchmark.synthetic_dataset(80, 12):
+            whole = app._compute_top_recommendations(customer_ids, 5)
+            with mock.patch.object(app, 'SCORING_MEMORY_BUDGET', 80 * app.SCORE_BYTES * 5):
+                self.assertEqual(app.scoring_chunk_size(80), 5)
+                chunked = app._compute_top_recommendations(customer_ids, 5)
+
+            for customer_id in customer_ids:
+                self.assertEqual(
+                    chunked[customer_id].records(app.get_store()), whole[customer_id].records(app.get_store())
+                )
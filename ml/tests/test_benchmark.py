@@ -0,0 +1,43 @@
+import asyncio
+
+from django.test import SimpleTestCase
+
+from ml import benchmark
+
+
+class ReplayTests(SimpleTestCase):
+    def test_every_request_of_a_small_catalog_succeeds(self):
+        with benchmark.synthetic_dataset(60, 40, seed=1) as (product_df, customer_df):
+            workload = benchmark.generate_workload(product_df, customer_df, 80, seed=1)
+            latencies, errors, elapsed = asyncio.run(benchmark.replay(workload, concurrency=4))
+
+        self.assertEqual(errors, [])
+        self.assertEqual(sum(len(values) for values in latencies.values()), len(workload))
+        self.assertGreater(elapsed, 0)
+
+    def test_unexpected_statuses_are_errors(self):
+        self.assertTrue(benchmark.expected_status({'endpoint': 'recommend'}, 200))
+        self.assertTrue(benchmark.expected_status({'endpoint': 'click'}, 404))
+        self.assertFalse(benchmark.expected_status({'endpoint': 'recommend'}, 404))
+        self.assertFalse(benchmark.expected_status({'endpoint': 'search'}, 301))
+        self.assertFalse(benchmark.expected_status({'endpoint': 'click'}, 500))
+
+
+class ReportTests(SimpleTestCase):
+    def test_summarize(self):
+        summary = benchmark.summarize([0.001, 0.002, 0.003, 0.004], 2.0)
+        self.assertEqual(summary['count'], 4)
+        self.assertEqual(summary['throughput'], 2.0)
+        self.assertEqual(summary['p50_ms'], 2.5)
+
+    def test_summarize_without_latencies(self):
+        summary = benchmark.summarize([], 0)
+        self.assertEqual(summary['count'], 0)
+        self.assertEqual(summary['p95_ms'], 0.0)
+
+    def test_compare_reports_regressions_beyond_tolerance(self):
+        baseline = {'endpoints': {'search': {'p95_ms': 10.0, 'throughput': 100.0}}}
+        slower = {'endpoints': {'search': {'p95_ms': 13.0, 'throughput': 70.0}}}
+        within = {'endpoints': {'search': {'p95_ms': 11.0, 'throughput': 90.0}}}
+        self.assertEqual(len(benchmark.compare(slower, baseline, tolerance=0.2)), 2)
+        self.assertEqual(benchmark.compare(within, baseline, tolerance=0.2), [])
@@ -0,0 +1,50 @@
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from ml.cache import RecommendationCache
+
+
+class RecommendationCacheTests(SimpleTestCase):
+    def test_bound_counts_every_list_of_a_customer(self):
+        cache = RecommendationCache(max_entries=3)
+        for top_n in range(1, 6):
+            cache.set('C1', top_n, [top_n])
+
+        self.assertEqual(cache.stats()['entries'], 3)
+        self.assertIsNone(cache.get('C1', 1))
+        self.assertEqual(cache.get('C1', 5), [5])
+
+    def test_expired_lists_are_dropped_on_set(self):
+        cache = RecommendationCache(ttl=10)
+        with mock.patch('ml.cache.time.monotonic', return_value=100.0):
+            cache.set('C1', 5, ['old'])
+        with mock.patch('ml.cache.time.monotonic', return_value=200.0):
+            cache.set('C2', 5, ['new'])
+            self.assertEqual(cache.stats()['entries'], 1)
+            self.assertEqual(cache.get('C2', 5), ['new'])
+
+    def test_invalidate_drops_every_list_of_the_customer(self):
+        cache = RecommendationCache()
+        cache.set('C1', 5, [1])
+        cache.set('C1', 10, [2])
+        cache.set('C2', 5, [3])
+        cache.invalidate('C1')
+
+        self.assertIsNone(cache.get('C1', 5))
+        self.assertIsNone(cache.get('C1', 10))
+        self.assertEqual(cache.get('C2', 5), [3])
+        self.assertEqual(cache.stats()['entries'], 1)
+
+    def test_hits_and_misses_are_exported(self):
+        cache = RecommendationCache()
+        cache.set('C1', 5, [1])
+        cache.get('C1', 5)
+        cache.get('C2', 5)
+        with mock.patch('ml.views.recommendation_cache', cache):
+            response = self.client.get('/ml/metrics/', secure=True)
+
+        body = response.content.decode()
+        self.assertIn('ml_recommendation_cache_lookups_total{result="hit"} 1', body)
+        self.assertIn('ml_recommendation_cache_lookups_total{result="miss"} 1', body)
+        self.assertIn('ml_recommendation_cache_entries 1', body)
@@ -0,0 +1,164 @@
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from ml import app, benchmark
+from ml.cache import RankedPages, make_cursor, parse_cursor
+from ml.store import Ranking
+
+
+class RankingStub:
+    """rank() of _ranked_page that counts how often it is called"""
+
+    def __init__(self, size):
+        self.results = list(range(size))
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return Ranking(app.loaded_version, self.results[:app.RANKED_CANDIDATES], {})
+
+
+class StoreStub:
+    """Product store whose records are the ranked rows themselves"""
+
+    def records(self, rows, scores):
+        return rows.tolist()
+
+
+class CursorTests(SimpleTestCase):
+    def test_round_trip(self):
+        self.assertEqual(parse_cursor(make_cursor('abc.def', 10), 200), ('abc.def', 10))
+
+    def test_malformed_cursors_are_rejected(self):
+        for cursor in ['', 'abc', 'abc.', 'abc.x', '.5', 'abc.-1', 'abc.200', 'zz.5000']:
+            with self.subTest(cursor=cursor):
+                with self.assertRaisesMessage(ValueError, 'Invalid cursor'):
+                    parse_cursor(cursor, 200)
+
+
+@mock.patch.object(app, 'RANKED_CANDIDATES', 12)
+class RankedPageTests(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch.object(app, 'ranked_pages', RankedPages())
+        self.ranked_pages = patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(app, 'get_store', StoreStub)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_pages_through_to_the_last_page(self):
+        rank = RankingStub(12)
+        pages = []
+        cursor = None
+        while True:
+            page, cursor = app._ranked_page(('recommend', 'C1'), rank, 5, cursor)
+            pages.append(page)
+            if cursor is None:
+                break
+
+        self.assertEqual(pages, [[0, 1, 2, 3, 4], [5, 6, 7, 8, 9], [10, 11]])
+        self.assertEqual(rank.calls, 1)
+
+    def test_ranking_of_another_catalog_is_computed_again(self):
+        rank = RankingStub(40)
+        _, cursor = app._ranked_page(('recommend', 'C1'), rank, 5, None)
+        with mock.patch.object(app, 'loaded_version', 'reloaded'):
+            page, _ = app._ranked_page(('recommend', 'C1'), rank, 5, cursor)
+        self.assertEqual(page, [5, 6, 7, 8, 9])
+        self.assertEqual(rank.calls, 2)
+
+    def test_cursor_past_the_candidates_is_rejected_without_ranking(self):
+        rank = RankingStub(40)
+        for cursor in ['zz.12', 'zz.5000']:
+            with self.subTest(cursor=cursor):
+                with self.assertRaisesMessage(ValueError, 'Invalid cursor'):
+                    app._ranked_page(('recommend', 'C1'), rank, 5, cursor)
+        self.assertEqual(rank.calls, 0)
+
+    def test_no_next_cursor_when_the_ranking_is_exhausted(self):
+        page, cursor = app._ranked_page(('recommend', 'C1'), RankingStub(3), 5, None)
+        self.assertEqual(page, [0, 1, 2])
+        self.assertIsNone(cursor)
+
+    def test_expired_ranking_is_computed_again_at_the_same_offset(self):
+        rank = RankingStub(40)
+        _, cursor = app._ranked_page(('recommend', 'C1'), rank, 5, None)
+        self.ranked_pages.clear()
+
+        page, next_cursor = app._ranked_page(('recommend', 'C1'), rank, 5, cursor)
+        self.assertEqual(page, [5, 6, 7, 8, 9])
+        self.assertEqual(rank.calls, 2)
+        self.assertNotEqual(parse_cursor(next_cursor, 12)[0], parse_cursor(cursor, 12)[0])
+        self.assertEqual(parse_cursor(next_cursor, 12)[1], 10)
+
+    def test_ttl_expiry_recomputes_the_ranking(self):
+        self.ranked_pages.ttl = -1
+        rank = RankingStub(40)
+        _, cursor = app._ranked_page(('recommend', 'C1'), rank, 5, None)
+        page, _ = app._ranked_page(('recommend', 'C1'), rank, 5, cursor)
+        self.assertEqual(page, [5, 6, 7, 8, 9])
+        self.assertEqual(rank.calls, 2)
+
+    def test_cursor_of_another_owner_is_not_served(self):
+        first = RankingStub(40)
+        _, cursor = app._ranked_page(('search', 'C1', 'shoes'), first, 5, None)
+
+        for owner in [('search', 'C2', 'shoes'), ('search', 'C1', 'lamp'), ('recommend', 'C1')]:
+            with self.subTest(owner=owner):
+                other = RankingStub(40)
+                other.results = [-value for value in other.results]
+                page, _ = app._ranked_page(owner, other, 5, cursor)
+                self.assertEqual(page, [-5, -6, -7, -8, -9])
+                self.assertEqual(other.calls, 1)
+
+
+class PaginatedViewTests(SimpleTestCase):
+    def test_malformed_cursor_is_a_bad_request(self):
+        with benchmark.synthetic_dataset(30, 10) as (_, customer_df):
+            customer_id = customer_df['Customer_ID'][0]
+            for path in [f'/ml/recommend/{customer_id}/', f'/ml/search/{customer_id}/']:
+                with self.subTest(path=path):
+                    response = self.client.get(path, {'query': 'shoes', 'cursor': 'abc.x'}, secure=True)
+                    self.assertEqual(response.status_code, 400)
+                    self.assertEqual(response.json(), {'error': 'Invalid cursor'})
+
+    def test_recommendations_page_through_the_next_cursor(self):
+        with benchmark.synthetic_dataset(30, 10) as (_, customer_df):
+            path = f"/ml/recommend/{customer_df['Customer_ID'][0]}/"
+            seen = []
+            params = {'top_n': 7}
+            while True:
+                response = self.client.get(path, params, secure=True)
+                self.assertEqual(response.status_code, 200)
+                seen.extend(product['Product_ID'] for product in response.json())
+                if 'X-Next-Cursor' not in response:
+                    break
+                params['cursor'] = response['X-Next-Cursor']
+
+        self.assertEqual(len(seen), len(set(seen)))
+        self.assertGreater(len(seen), 7)
+
+    def test_forged_cursors_score_and_cache_nothing(self):
+        with benchmark.synthetic_dataset(300, 10) as (_, customer_df):
+            path = f"/ml/recommend/{customer_df['Customer_ID'][0]}/"
+            for offset in range(app.RANKED_CANDIDATES, app.RANKED_CANDIDATES + 50):
+                response = self.client.get(path, {'cursor': f'zz.{offset}'}, secure=True)
+                self.assertEqual(response.status_code, 400)
+            self.assertEqual(app.recommendation_cache.stats()['entries'], 0)
+
+    def test_one_compact_ranking_is_cached_per_customer(self):
+        with benchmark.synthetic_dataset(300, 10) as (_, customer_df):
+            customer_id = customer_df['Customer_ID'][0]
+            for top_n in [5, 10, 50]:
+                response = self.client.get(f'/ml/recommend/{customer_id}/', {'top_n': top_n}, secure=True)
+                self.assertEqual(len(response.json()), top_n)
+            self.assertEqual(len(app.get_top_recommendations(customer_id, 7)), 7)
+
+            self.assertEqual(app.recommendation_cache.stats()['entries'], 1)
+            ranking = app.recommendation_cache.get(customer_id, app.RANKED_CANDIDATES)
+            self.assertEqual(len(ranking), app.RANKED_CANDIDATES)
+            self.assertLessEqual(
+                ranking.rows.nbytes + sum(values.nbytes for values in ranking.scores.values()),
+                12 * app.RANKED_CANDIDATES
+            )
@@ -0,0 +1,38 @@
+import os
+import threading
+
+
+class ProcessThread:
+    """Daemon thread running ``target``, started at most once per process.
+
+    Threads do not survive a fork, so ``start`` compares the process ID it
+    last started in and starts a fresh thread in a forked worker, or once
+    the previous thread has returned.
+    """
+
+    def __init__(self, target, name):
+        self.target = target
+        self.name = name
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start the thread unless it is already running in this process"""
+        if self.started():
+            return
+        with self._lock:
+            if self.started():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self.target, name=self.name, daemon=True)
+            self._thread.start()
+
+    def started(self):
+        """Whether the thread is running in this process"""
+        return self._pid == os.getpid() and self._thread.is_alive()
+
+    def join(self):
+        """Wait for the thread of this process to return"""
+        if self.started():
+            self._thread.join()
@@ -2,8 +2,11 @@ from django.urls import path
 from . import views
 
 urlpatterns = [
+    path('recommend/batch/', views.recommend_batch, name='recommend_batch'),
     path('recommend/<str:customer_id>/', views.recommend, name='recommend'),
     path('search/<str:customer_id>/', views.search, name='search'),
+    path('autocomplete/', views.autocomplete, name='autocomplete'),
     path('click/<str:customer_id>/<str:product_id>/', views.click, name='click'),
     path('preferences/<str:customer_id>/', views.get_preferences, name='preferences'),
+    path('metrics/', views.metrics, name='metrics'),
 ] 
\ No newline at end of file
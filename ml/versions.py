@@ -0,0 +1,45 @@
+import os
+import shutil
+import time
+
+# Name of the file holding the directory name of the current version
+CURRENT_FILE = 'CURRENT'
+# Written last into every version directory; marks the version complete
+META_FILE = 'meta.json'
+
+
+def new_version(directory):
+    """Create an empty directory for a new version under directory; return (version, path)"""
+    version = time.strftime('%Y%m%d%H%M%S') + f'-{os.getpid()}'
+    version_dir = os.path.join(directory, version)
+    os.makedirs(version_dir)
+    return version, version_dir
+
+
+def publish_version(directory, version, keep=2):
+    """Make version current and delete all but the newest keep complete versions.
+
+    Readers that still map an older version keep reading it until they
+    notice the switch.
+    """
+    # Swap the pointer atomically so readers never see a partial version
+    tmp_path = os.path.join(directory, CURRENT_FILE + '.tmp')
+    with open(tmp_path, 'w') as f:
+        f.write(version)
+    os.replace(tmp_path, os.path.join(directory, CURRENT_FILE))
+
+    versions = sorted(
+        name for name in os.listdir(directory)
+        if os.path.isfile(os.path.join(directory, name, META_FILE))
+    )
+    for old in versions[:-keep]:
+        shutil.rmtree(os.path.join(directory, old), ignore_errors=True)
+
+
+def current_version(directory):
+    """Return the name of the current version under directory, or None"""
+    try:
+        with open(os.path.join(directory, CURRENT_FILE)) as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
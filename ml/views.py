@@ -1,48 +1,191 @@
-from django.http import JsonResponse
+import json
+import secrets
+from django.http import HttpResponse
 from django.conf import settings
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
 from .app import (
-    get_top_recommendations,
-    get_query_recommendations,
-    update_user_preferences,
-    update_product_popularity,
+    get_recommendation_page,
+    get_search_page,
+    get_top_recommendations_batch,
+    get_autocomplete_suggestions,
+    record_click,
+    record_product_views,
+    recommendation_cache,
     get_preferences as ml_get_preferences
 )
+from .metrics import metrics as ml_metrics
+from .offload import FeedbackQueue, WorkerPool
+from .responses import FastJsonResponse as JsonResponse
 
-def recommend(request, customer_id):
+# Scoring and SQLite reads run on a bounded pool so the event loop stays
+# free; feedback writes are applied in the background
+worker_pool = WorkerPool(settings.ML_WORKER_THREADS)
+feedback_queue = FeedbackQueue(settings.ML_FEEDBACK_QUEUE_SIZE)
+
+# Fields of the recommendation and search results that ?fields= can select
+RECOMMENDATION_FIELDS = ('Product_ID', 'Brand', 'Category', 'Subcategory', 'Similarity_Score', 'Final_Score')
+SEARCH_FIELDS = ('Product_ID', 'Brand', 'Category', 'Subcategory', 'Text_Similarity', 'Combined_Score')
+
+def parse_fields(value, allowed):
+    """Parse a comma-separated field list; None selects every field"""
+    if not value:
+        return None
+    fields = [field.strip() for field in value.split(',') if field.strip()]
+    unknown = [field for field in fields if field not in allowed]
+    if unknown:
+        raise ValueError(f"Unknown fields {', '.join(unknown)}; expected some of {', '.join(allowed)}")
+    return fields
+
+def select_fields(results, fields):
+    """Keep only the selected fields of each result"""
+    if fields is None:
+        return results
+    return [{field: result[field] for field in fields} for result in results]
+
+def check_top_n(top_n):
+    """Return top_n; raise ValueError unless it is an integer in 1..ML_MAX_TOP_N"""
+    if isinstance(top_n, bool) or not isinstance(top_n, int) or not 1 <= top_n <= settings.ML_MAX_TOP_N:
+        raise ValueError(f"top_n must be an integer between 1 and {settings.ML_MAX_TOP_N}")
+    return top_n
+
+def parse_top_n(request):
+    """Read ?top_n=, defaulting to 5; raise ValueError outside 1..ML_MAX_TOP_N"""
     try:
-        results = get_top_recommendations(customer_id)
+        top_n = int(request.GET.get("top_n", 5))
+    except ValueError:
+        top_n = None
+    return check_top_n(top_n)
+
+def page_response(results, next_cursor):
+    """Respond with a page of results; the next page's cursor goes in X-Next-Cursor"""
+    response = JsonResponse(results, safe=False)
+    if next_cursor:
+        response['X-Next-Cursor'] = next_cursor
+    return response
+
+def queue_feedback(fn, *args):
+    """Queue a feedback write, or apply it inline when the queue is full"""
+    if not feedback_queue.submit(fn, *args):
+        fn(*args)
+
+async def recommend(request, customer_id):
+    """Return a page of recommendations.
+
+    ``?top_n=`` sets the page size and ``?cursor=`` takes the value of the
+    previous page's X-Next-Cursor header to fetch the page after it.
+    """
+    try:
+        fields = parse_fields(request.GET.get("fields"), RECOMMENDATION_FIELDS)
+        top_n = parse_top_n(request)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    
+    try:
+        results, next_cursor = await worker_pool.run(
+            get_recommendation_page, customer_id, top_n, request.GET.get("cursor")
+        )
         # Record view interaction for each recommended product
-        for product in results:
-            update_product_popularity(product['Product_ID'], 'view')
-        return JsonResponse(results, safe=False)
+        queue_feedback(record_product_views, [product['Product_ID'] for product in results])
+        return page_response(select_fields(results, fields), next_cursor)
+    except ValueError as e:
+        # Malformed cursor
+        return JsonResponse({"error": str(e)}, status=400)
+    except Exception as e:
+        return JsonResponse({"error": str(e)}, status=500)
+
+def batch_authorized(request):
+    """Whether request carries the ML_BATCH_API_TOKEN bearer token"""
+    token = settings.ML_BATCH_API_TOKEN
+    if not token:
+        return False
+    return secrets.compare_digest(request.headers.get('Authorization', '').encode(), f'Bearer {token}'.encode())
+
+@csrf_exempt
+@require_POST
+async def recommend_batch(request):
+    """Score many customers at once, e.g. for campaigns or cache pre-warming.
+
+    Expects a JSON body ``{"customer_ids": [...], "top_n": 5}``, optionally
+    with a ``fields`` list, and returns the recommendations keyed by
+    customer ID. Nothing is shown to the customers, so no views are
+    recorded. Callers authenticate with ``Authorization: Bearer`` and the
+    ML_BATCH_API_TOKEN setting.
+    """
+    if not batch_authorized(request):
+        return JsonResponse({"error": "A valid API token is required"}, status=403)
+    
+    try:
+        payload = json.loads(request.body or b'{}')
+        customer_ids = payload.get('customer_ids', [])
+        top_n = payload.get('top_n', 5)
+        fields = payload.get('fields')
+    except (ValueError, TypeError, AttributeError):
+        return JsonResponse({"error": "Expected a JSON object with customer_ids and top_n"}, status=400)
+    
+    if not isinstance(customer_ids, list) or not all(
+        isinstance(customer_id, (str, int)) and not isinstance(customer_id, bool)
+        for customer_id in customer_ids
+    ):
+        return JsonResponse({"error": "customer_ids must be a list of customer IDs"}, status=400)
+    customer_ids = [str(customer_id) for customer_id in customer_ids]
+    
+    try:
+        check_top_n(top_n)
+        if not isinstance(fields, str):
+            fields = ','.join(map(str, fields or []))
+        fields = parse_fields(fields, RECOMMENDATION_FIELDS)
+    except (ValueError, TypeError) as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    
+    if len(customer_ids) > settings.ML_BATCH_MAX_CUSTOMERS:
+        return JsonResponse(
+            {"error": f"At most {settings.ML_BATCH_MAX_CUSTOMERS} customers per request"},
+            status=400
+        )
+    
+    try:
+        results = await worker_pool.run(get_top_recommendations_batch, customer_ids, top_n)
+        return JsonResponse({
+            customer_id: select_fields(recommendations, fields)
+            for customer_id, recommendations in results.items()
+        })
     except Exception as e:
         return JsonResponse({"error": str(e)}, status=500)
 
-def search(request, customer_id):
+async def search(request, customer_id):
+    """Return a page of search results, paginated like recommend"""
     query = request.GET.get("query", "")
-    results = get_query_recommendations(customer_id, query)
+    try:
+        fields = parse_fields(request.GET.get("fields"), SEARCH_FIELDS)
+        top_n = parse_top_n(request)
+        results, next_cursor = await worker_pool.run(
+            get_search_page, customer_id, query, top_n, request.GET.get("cursor")
+        )
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    
     # Record view interaction for search results
-    for product in results:
-        update_product_popularity(product['Product_ID'], 'view')
-    return JsonResponse(results, safe=False)
-
-def click(request, customer_id, product_id):
-    try:
-        # Get product data
-        from products.models import Product
-        product = Product.objects.get(id=product_id)
-        product_data = {
-            'Product_ID': str(product.id),
-            'Brand': product.brand,
-            'Category': product.category,
-            'Subcategory': product.subcategory
-        }
-        
-        # Update user preferences based on clicked product
-        update_user_preferences(customer_id, product_data)
-        
-        # Record click interaction
-        update_product_popularity(product_id, 'click')
+    queue_feedback(record_product_views, [product['Product_ID'] for product in results])
+    return page_response(select_fields(results, fields), next_cursor)
+
+async def autocomplete(request):
+    query = request.GET.get("query", "")
+    try:
+        limit = int(request.GET.get("limit", 10))
+    except ValueError:
+        return JsonResponse({"error": "limit must be an integer"}, status=400)
+    # The first call may have to load the catalog, so keep it off the event loop
+    suggestions = await worker_pool.run(get_autocomplete_suggestions, query, min(max(limit, 1), 50))
+    return JsonResponse(suggestions, safe=False)
+
+async def click(request, customer_id, product_id):
+    try:
+        # Validate against the in-memory catalog and append to the click log
+        # on the worker pool, since the insert can wait on other writers;
+        # preferences and popularity are updated from the log in the background
+        if not await worker_pool.run(record_click, customer_id, product_id):
+            return JsonResponse({"error": f"Unknown product {product_id}"}, status=404)
         
         return JsonResponse({
             "status": "success",
@@ -51,9 +194,17 @@ def click(request, customer_id, product_id):
     except Exception as e:
         return JsonResponse({"error": str(e)}, status=500)
 
-def get_preferences(request, customer_id):
+async def get_preferences(request, customer_id):
     try:
-        preferences = ml_get_preferences(customer_id)
+        preferences = await worker_pool.run(ml_get_preferences, customer_id)
         return JsonResponse(preferences, safe=False)
     except Exception as e:
-        return JsonResponse([], safe=False)  # Return empty list on error 
\ No newline at end of file
+        return JsonResponse([], safe=False)  # Return empty list on error 
+
+async def metrics(request):
+    """Expose the pipeline stage histograms and counters of this process to Prometheus"""
+    cache_stats = recommendation_cache.stats()
+    ml_metrics.set('ml_recommendation_cache_lookups_total', cache_stats['hits'], result='hit')
+    ml_metrics.set('ml_recommendation_cache_lookups_total', cache_stats['misses'], result='miss')
+    ml_metrics.set('ml_recommendation_cache_entries', cache_stats['entries'])
+    return HttpResponse(ml_metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,68 @@
+import atexit
+import threading
+
+from .threads import ProcessThread
+
+
+class PopularityBuffer:
+    """In-memory write-behind buffer for product view and click counters.
+
+    Deltas are aggregated per product and handed to ``write_batch`` as a
+    list of ``(product_id, view_delta, click_delta)`` tuples, either by a
+    background timer every ``interval`` seconds or as soon as ``max_pending``
+    distinct products are waiting. Pending deltas are flushed at interpreter
+    exit.
+    """
+
+    def __init__(self, write_batch, interval=2.0, max_pending=500):
+        self.write_batch = write_batch
+        self.interval = interval
+        self.max_pending = max_pending
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._worker = ProcessThread(self._run, 'popularity-flush')
+        atexit.register(self.close)
+
+    def add(self, product_id, views=0, clicks=0):
+        """Queue a counter delta for product_id"""
+        with self._lock:
+            counts = self._pending.setdefault(product_id, [0, 0])
+            counts[0] += views
+            counts[1] += clicks
+            pending = len(self._pending)
+
+        if not self._stop.is_set():
+            self._worker.start()
+        if pending >= self.max_pending:
+            self.flush()
+
+    def flush(self):
+        """Write all pending deltas in a single batch"""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            if not pending:
+                return
+
+            rows = [(product_id, views, clicks) for product_id, (views, clicks) in pending.items()]
+            try:
+                self.write_batch(rows)
+            except Exception as e:
+                print(f"Error flushing product popularity: {str(e)}")
+                # Put the deltas back so they go out with the next flush
+                with self._lock:
+                    for product_id, views, clicks in rows:
+                        counts = self._pending.setdefault(product_id, [0, 0])
+                        counts[0] += views
+                        counts[1] += clicks
+
+    def close(self):
+        """Stop the background flusher and write whatever is still pending"""
+        self._stop.set()
+        self.flush()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.flush()
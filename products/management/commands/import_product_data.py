@@ -1,37 +1,80 @@
 import csv
 import os
+from decimal import Decimal
+from itertools import islice
 from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
 from products.models import Product
-from django.core.files import File
+from recommendations.recommender import content_models
 from django.conf import settings
 
 class Command(BaseCommand):
     help = 'Import product data from CSV file'
 
-    def handle(self, *args, **kwargs):
+    def add_arguments(self, parser):
+        parser.add_argument('--file', default=os.path.join(settings.BASE_DIR, 'data', 'products_recommandation_data.csv'),
+                            help='Path to the product CSV file')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Number of CSV rows processed per batch')
+
+    def handle(self, *args, **options):
         # Path to the CSV file
-        csv_file_path = os.path.join(settings.BASE_DIR, 'data', 'products_recommandation_data.csv')
-        
+        csv_file_path = options['file']
+        batch_size = options['batch_size']
+
         try:
-            with open(csv_file_path, 'r', encoding='utf-8') as file:
+            # Fetch the existing catalog once, keyed by product name
+            existing = {
+                product.name: product
+                for product in Product.objects.only('id', 'name', 'description', 'price', 'category', 'updated_at')
+            }
+
+            created = updated = unchanged = 0
+            now = timezone.now()
+            with open(csv_file_path, 'r', encoding='utf-8') as file, transaction.atomic():
                 reader = csv.DictReader(file)
-                for row in reader:
-                    # Create or update product
-                    product, created = Product.objects.get_or_create(
-                        name=row['Product_ID'],
-                        defaults={
-                            'description': row.get('Description', 'No description available'),
-                            'price': float(row.get('Price', 0)),
-                            'category': row.get('Category', 'Uncategorized')
+                while True:
+                    rows = list(islice(reader, batch_size))
+                    if not rows:
+                        break
+
+                    to_create = []
+                    to_update = []
+                    for row in rows:
+                        fields = {
+                            'description': row.get('Description') or 'No description available',
+                            'price': Decimal(str(float(row.get('Price') or 0))).quantize(Decimal('0.01')),
+                            'category': row.get('Category') or 'Uncategorized'
                         }
-                    )
-                    
-                    if created:
-                        self.stdout.write(self.style.SUCCESS(f'Created product: {product.name}'))
-                    else:
-                        self.stdout.write(self.style.WARNING(f'Product already exists: {product.name}'))
-                        
+                        product = existing.get(row['Product_ID'])
+                        if product is None:
+                            product = Product(name=row['Product_ID'], **fields)
+                            existing[product.name] = product
+                            to_create.append(product)
+                        elif any(getattr(product, field) != value for field, value in fields.items()):
+                            for field, value in fields.items():
+                                setattr(product, field, value)
+                            product.updated_at = now
+                            to_update.append(product)
+                        else:
+                            unchanged += 1
+
+                    Product.objects.bulk_create(to_create, batch_size=batch_size)
+                    Product.objects.bulk_update(to_update, ['description', 'price', 'category', 'updated_at'], batch_size=batch_size)
+                    created += len(to_create)
+                    updated += len(to_update)
+                    self.stdout.write(f'Processed {created + updated + unchanged} rows')
+
+            # Bulk operations skip the model signals, so refresh the content model here
+            if created or updated:
+                content_models.invalidate()
+
+            self.stdout.write(self.style.SUCCESS(
+                f'Created {created} products, updated {updated}, {unchanged} already up to date'
+            ))
+
         except FileNotFoundError:
             self.stdout.write(self.style.ERROR(f'CSV file not found at {csv_file_path}'))
         except Exception as e:
-            self.stdout.write(self.style.ERROR(f'Error importing data: {str(e)}')) 
\ No newline at end of file
+            self.stdout.write(self.style.ERROR(f'Error importing data: {str(e)}'))
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:06
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['name'], name='product_name'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['category'], name='product_category'),
+        ),
+        migrations.AddIndex(
+            model_name='productview',
+            index=models.Index(fields=['user', 'view_date'], name='productview_user_date'),
+        ),
+        migrations.AddIndex(
+            model_name='purchasehistory',
+            index=models.Index(fields=['user', 'purchase_date'], name='purchase_user_date'),
+        ),
+    ]
@@ -12,6 +12,13 @@ class Product(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # The dashboard looks ML recommendations up by name
+            models.Index(fields=['name'], name='product_name'),
+            models.Index(fields=['category'], name='product_category'),
+        ]
+
     def __str__(self):
         return self.name
 
@@ -29,7 +36,19 @@ class PurchaseHistory(models.Model):
     purchase_date = models.DateTimeField(auto_now_add=True)
     quantity = models.PositiveIntegerField(default=1)
 
+    class Meta:
+        indexes = [
+            # Serves a user's purchases in date order
+            models.Index(fields=['user', 'purchase_date'], name='purchase_user_date'),
+        ]
+
 class ProductView(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
-    view_date = models.DateTimeField(auto_now_add=True) 
\ No newline at end of file
+    view_date = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # Serves a user's view history in date order
+            models.Index(fields=['user', 'view_date'], name='productview_user_date'),
+        ] 
\ No newline at end of file
@@ -0,0 +1,51 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from .models import Product, PurchaseHistory, Wishlist
+
+
+class ListQueryTests(TestCase):
+    """The list pages run a fixed number of queries however many rows they show"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            email='shopper@example.com', username='shopper', password='secret'
+        )
+        cls.products = [
+            Product.objects.create(
+                name=f'Product {i}', description='A product', price=10 + i, category='Books'
+            )
+            for i in range(8)
+        ]
+        for product in cls.products[:5]:
+            Wishlist.objects.create(user=cls.user, product=product)
+            PurchaseHistory.objects.create(user=cls.user, product=product, quantity=2)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def get(self, name):
+        response = self.client.get(reverse(name), secure=True)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_product_list(self):
+        # Session, user, count, products, wishlisted IDs
+        with self.assertNumQueries(5):
+            response = self.get('product_list')
+        self.assertEqual(len(response.context['products']), 8)
+        self.assertEqual(response.context['wishlist'], {product.id for product in self.products[:5]})
+
+    def test_wishlist(self):
+        # Session, user, count, items with their products
+        with self.assertNumQueries(4):
+            response = self.get('wishlist')
+        self.assertEqual(len(response.context['wishlist_items']), 5)
+
+    def test_purchase_history(self):
+        # Session, user, count, purchases with their products
+        with self.assertNumQueries(4):
+            response = self.get('purchase_history')
+        self.assertEqual(len(response.context['purchases']), 5)
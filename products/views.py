@@ -1,12 +1,25 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
+from django.core.paginator import Paginator
 from .models import Product, Wishlist, PurchaseHistory, ProductView
 from recommendations.recommender import Recommender
 
+# Items per page of the product, wishlist and purchase history lists
+PAGE_SIZE = 24
+
+# Product columns the list templates render
+LIST_FIELDS = ('id', 'name', 'description', 'price', 'image')
+
+def paginate(request, queryset):
+    """Return the page of queryset named by ?page="""
+    return Paginator(queryset, PAGE_SIZE).get_page(request.GET.get('page'))
+
 @login_required
 def product_list(request):
-    products = Product.objects.all()
-    return render(request, 'products/list.html', {'products': products})
+    products = paginate(request, Product.objects.only(*LIST_FIELDS).order_by('id'))
+    # IDs of the wishlisted products, so each card doesn't query for its own
+    wishlist = set(Wishlist.objects.filter(user=request.user).values_list('product_id', flat=True))
+    return render(request, 'products/list.html', {'products': products, 'wishlist': wishlist})
 
 @login_required
 def product_detail(request, product_id):
@@ -17,7 +30,7 @@ def product_detail(request, product_id):
     
     # Get recommendations
     recommender = Recommender()
-    recommendations = recommender.generate_recommendations(request.user.id)
+    recommendations = recommender.get_recommendations(request.user.id)
     
     # Check if product is in wishlist
     in_wishlist = Wishlist.objects.filter(user=request.user, product=product).exists()
@@ -30,12 +43,23 @@ def product_detail(request, product_id):
 
 @login_required
 def wishlist(request):
-    wishlist_items = Wishlist.objects.filter(user=request.user)
+    # Load each item's product in the same query
+    wishlist_items = paginate(request, (
+        Wishlist.objects.filter(user=request.user)
+        .select_related('product')
+        .only('id', *(f'product__{field}' for field in LIST_FIELDS))
+        .order_by('-created_at')
+    ))
     return render(request, 'products/wishlist.html', {'wishlist_items': wishlist_items})
 
 @login_required
 def purchase_history(request):
-    purchases = PurchaseHistory.objects.filter(user=request.user)
+    purchases = paginate(request, (
+        PurchaseHistory.objects.filter(user=request.user)
+        .select_related('product')
+        .only('id', 'purchase_date', 'quantity', *(f'product__{field}' for field in LIST_FIELDS))
+        .order_by('-purchase_date')
+    ))
     return render(request, 'products/purchase_history.html', {'purchases': purchases})
 
 @login_required
@@ -0,0 +1,10 @@
+from django.apps import AppConfig
+
+class RecommendationsConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'recommendations'
+    verbose_name = 'Recommendations'
+
+    def ready(self):
+        # Register the model cache invalidation handlers
+        from . import signals
@@ -0,0 +1,142 @@
+import os
+import pickle
+import threading
+import time
+
+import numpy as np
+from scipy import sparse
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+
+class ContentModel:
+    """Fitted TF-IDF vectors of every product's name, description and category.
+
+    Rows are L2-normalized, so the dot product of two rows is their cosine
+    similarity and neighbours can be found with a sparse row-vs-matrix
+    product instead of a dense all-pairs similarity matrix.
+    """
+
+    def __init__(self, product_ids, vectorizer, matrix):
+        self.product_ids = np.asarray(product_ids, dtype=np.int64)
+        self.vectorizer = vectorizer
+        self.matrix = matrix.tocsr()
+        self.matrix_t = self.matrix.T.tocsr()
+
+    @classmethod
+    def fit(cls, products):
+        """Fit the model on an iterable of (id, name, description, category) rows"""
+        product_ids = []
+        descriptions = []
+        for product_id, name, description, category in products:
+            product_ids.append(product_id)
+            descriptions.append(f"{name} {description} {category}")
+
+        vectorizer = TfidfVectorizer(stop_words='english')
+        if descriptions:
+            matrix = vectorizer.fit_transform(descriptions)
+        else:
+            matrix = sparse.csr_matrix((0, 0))
+        return cls(product_ids, vectorizer, matrix)
+
+    def similar(self, product_ids, n_neighbors=5):
+        """Return the n_neighbors most similar products to each of product_ids.
+
+        The result maps every known product ID to a list of
+        ``(product_id, score)`` pairs, best first, excluding the product itself.
+        """
+        ids = np.asarray(list(product_ids), dtype=np.int64)
+        if len(ids) == 0 or len(self.product_ids) == 0:
+            return {}
+
+        # product_ids come from an ordered query, so rows can be found by bisection
+        rows = np.minimum(np.searchsorted(self.product_ids, ids), len(self.product_ids) - 1)
+        known = self.product_ids[rows] == ids
+        ids, rows = ids[known], rows[known]
+
+        similarity = (self.matrix[rows] @ self.matrix_t).tocsr()
+        neighbours = {}
+        for i, (product_id, row) in enumerate(zip(ids, rows)):
+            lo, hi = similarity.indptr[i], similarity.indptr[i + 1]
+            cols = similarity.indices[lo:hi]
+            vals = similarity.data[lo:hi]
+            keep = cols != row
+            cols, vals = cols[keep], vals[keep]
+            if len(vals) > n_neighbors:
+                top = np.argpartition(-vals, n_neighbors - 1)[:n_neighbors]
+                cols, vals = cols[top], vals[top]
+            order = np.lexsort((cols, -vals))
+            neighbours[int(product_id)] = [
+                (int(self.product_ids[cols[j]]), float(vals[j])) for j in order
+            ]
+        return neighbours
+
+
+class ContentModelStore:
+    """Process-wide cache of the content model, persisted to a pickle file.
+
+    The model is fitted once and written to ``path``; other processes load
+    that file instead of refitting. ``invalidate`` drops the in-memory copy
+    and the file, and every process notices a missing or replaced file
+    within ``check_interval`` seconds and reloads or refits lazily.
+    """
+
+    def __init__(self, path, load_products, check_interval=60.0):
+        self.path = path
+        self.load_products = load_products
+        self.check_interval = check_interval
+        self._model = None
+        self._mtime = None
+        self._checked_at = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        """Return the current model, loading or fitting it if needed"""
+        now = time.monotonic()
+        if self._model is not None and now - self._checked_at < self.check_interval:
+            return self._model
+
+        with self._lock:
+            self._checked_at = now
+            mtime = self._file_mtime()
+            if self._model is not None and mtime == self._mtime:
+                return self._model
+
+            if mtime is not None:
+                try:
+                    with open(self.path, 'rb') as f:
+                        self._model = pickle.load(f)
+                    self._mtime = mtime
+                    return self._model
+                except (OSError, pickle.UnpicklingError, EOFError) as e:
+                    print(f"Error loading content model: {str(e)}")
+
+            self._model = ContentModel.fit(self.load_products())
+            self._save(self._model)
+            self._mtime = self._file_mtime()
+            return self._model
+
+    def invalidate(self):
+        """Forget the fitted model here and in every other process"""
+        with self._lock:
+            self._model = None
+            self._mtime = None
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+
+    def _file_mtime(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _save(self, model):
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = f'{self.path}.{os.getpid()}.tmp'
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(model, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"Error saving content model: {str(e)}")
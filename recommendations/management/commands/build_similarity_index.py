@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from recommendations.recommender import Recommender
+from recommendations.similarity import build_item_neighbors, save_item_index
+
+class Command(BaseCommand):
+    help = 'Precompute the item-item neighbour index used by collaborative filtering'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--k', type=int, default=settings.RECOMMENDER_NEIGHBORS_K,
+                            help='Number of neighbours kept per product')
+        parser.add_argument('--output', default=settings.RECOMMENDER_INDEX_DIR,
+                            help='Directory the index versions are written to')
+        parser.add_argument('--keep', type=int, default=2,
+                            help='Number of index versions kept on disk')
+
+    def handle(self, *args, **options):
+        matrix, user_ids, product_ids = Recommender().get_user_product_matrix()
+        self.stdout.write(f'Interaction matrix: {len(user_ids)} users x {len(product_ids)} products, {matrix.nnz} entries')
+
+        neighbors, scores = build_item_neighbors(matrix, options['k'])
+        version = save_item_index(options['output'], product_ids, neighbors, scores, keep=options['keep'])
+
+        self.stdout.write(self.style.SUCCESS(f'Built similarity index {version} in {options["output"]}'))
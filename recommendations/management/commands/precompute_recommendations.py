@@ -0,0 +1,81 @@
+import multiprocessing
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connections, transaction
+from recommendations.models import Recommendation
+from recommendations.recommender import Recommender
+from recommendations.similarity import get_item_index
+
+User = get_user_model()
+
+RECOMMENDATION_TYPE = 'hybrid'
+
+def score_users(args):
+    """Compute the hybrid recommendations of a chunk of users in a worker process"""
+    user_ids, top_n = args
+    recommender = Recommender()
+    rows = []
+    for user_id in user_ids:
+        try:
+            for product, score in recommender.generate_recommendations(user_id, top_n):
+                rows.append((user_id, product.id, float(score)))
+        except Exception as e:
+            print(f"Error scoring user {user_id}: {str(e)}")
+    return user_ids, rows
+
+class Command(BaseCommand):
+    help = 'Batch-score every user with the hybrid recommender and store the top N in Recommendation'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-n', type=int, default=10,
+                            help='Number of recommendations stored per user')
+        parser.add_argument('--chunk-size', type=int, default=200,
+                            help='Number of users scored per task')
+        parser.add_argument('--workers', type=int, default=multiprocessing.cpu_count(),
+                            help='Number of scoring processes (1 scores in this process)')
+
+    def handle(self, *args, **options):
+        top_n = options['top_n']
+        chunk_size = options['chunk_size']
+
+        if get_item_index(settings.RECOMMENDER_INDEX_DIR) is None:
+            self.stdout.write(self.style.WARNING(
+                'No similarity index found; run build_similarity_index first for faster scoring'
+            ))
+
+        user_ids = list(User.objects.order_by('id').values_list('id', flat=True))
+        tasks = [(user_ids[i:i + chunk_size], top_n) for i in range(0, len(user_ids), chunk_size)]
+
+        scored = 0
+        written = 0
+        if options['workers'] > 1 and len(tasks) > 1:
+            # Forked workers must not reuse this process's database connections
+            connections.close_all()
+            with multiprocessing.Pool(options['workers']) as pool:
+                for chunk, rows in pool.imap_unordered(score_users, tasks):
+                    written += self.store(chunk, rows)
+                    scored += len(chunk)
+                    self.stdout.write(f'Scored {scored}/{len(user_ids)} users')
+        else:
+            for task in tasks:
+                chunk, rows = score_users(task)
+                written += self.store(chunk, rows)
+                scored += len(chunk)
+                self.stdout.write(f'Scored {scored}/{len(user_ids)} users')
+
+        self.stdout.write(self.style.SUCCESS(f'Stored {written} recommendations for {len(user_ids)} users'))
+
+    def store(self, user_ids, rows):
+        """Replace the stored recommendations of a chunk of users"""
+        with transaction.atomic():
+            Recommendation.objects.filter(user_id__in=user_ids, recommendation_type=RECOMMENDATION_TYPE).delete()
+            Recommendation.objects.bulk_create(
+                [
+                    Recommendation(user_id=user_id, product_id=product_id, score=score,
+                                   recommendation_type=RECOMMENDATION_TYPE)
+                    for user_id, product_id, score in rows
+                ],
+                batch_size=1000
+            )
+        return len(rows)
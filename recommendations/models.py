@@ -18,4 +18,8 @@ class Recommendation(models.Model):
     recommendation_type = models.CharField(max_length=50)  # e.g., 'collaborative', 'content-based'
 
     class Meta:
-        ordering = ['-score'] 
\ No newline at end of file
+        ordering = ['-score']
+        indexes = [
+            # Serves a user's precomputed recommendations in score order
+            models.Index(fields=['user', '-score'], name='recommendation_user_score'),
+        ]
@@ -1,61 +1,139 @@
+from datetime import timedelta
 import numpy as np
+from scipy import sparse
 from sklearn.metrics.pairwise import cosine_similarity
-from sklearn.feature_extraction.text import TfidfVectorizer
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.utils import timezone
+from ml.metrics import metrics
 from products.models import Product, PurchaseHistory, ProductView
 from .models import UserPreferences, Recommendation
+from .content import ContentModelStore
+from .similarity import get_item_index
 
 User = get_user_model()
 
-class Recommender:
-    def __init__(self):
-        self.vectorizer = TfidfVectorizer(stop_words='english')
+def load_product_descriptions():
+    """Stream the (id, name, description, category) rows the content model is fitted on"""
+    return Product.objects.order_by('id').values_list('id', 'name', 'description', 'category').iterator()
+
+# Shared by every Recommender; invalidated by the Product signals in signals.py
+content_models = ContentModelStore(
+    settings.RECOMMENDER_CONTENT_MODEL_PATH,
+    load_product_descriptions,
+    settings.RECOMMENDER_INDEX_CHECK_INTERVAL
+)
 
+class Recommender:
+    @metrics.timed('recommender_interaction_matrix')
     def get_user_product_matrix(self):
-        """Create user-product interaction matrix"""
-        users = User.objects.all()
-        products = Product.objects.all()
-        matrix = np.zeros((len(users), len(products)))
-        
-        # Fill matrix with purchase history
-        for purchase in PurchaseHistory.objects.all():
-            user_idx = list(users).index(purchase.user)
-            product_idx = list(products).index(purchase.product)
-            matrix[user_idx, product_idx] = 1
-            
-        # Add view history with lower weight
-        for view in ProductView.objects.all():
-            user_idx = list(users).index(view.user)
-            product_idx = list(products).index(view.product)
-            matrix[user_idx, product_idx] += 0.5
-            
-        return matrix, users, products
+        """Create the sparse user-product interaction matrix.
+
+        Returns the CSR matrix together with the sorted user and product ID
+        arrays that map its rows and columns back to database IDs.
+        """
+        user_ids = np.fromiter(User.objects.order_by('id').values_list('id', flat=True), dtype=np.int64)
+        product_ids = np.fromiter(Product.objects.order_by('id').values_list('id', flat=True), dtype=np.int64)
+        shape = (len(user_ids), len(product_ids))
+        
+        # Purchases count once per user and product
+        purchases = np.array(
+            list(PurchaseHistory.objects.values_list('user_id', 'product_id').distinct()),
+            dtype=np.int64
+        ).reshape(-1, 2)
+        metrics.count_query('purchase_history', len(purchases))
+        purchase_matrix = sparse.csr_matrix(self._to_entries(purchases, 1.0, user_ids, product_ids), shape=shape)
+        
+        # Add view history with lower weight, once per view
+        views = np.array(
+            list(ProductView.objects.values_list('user_id', 'product_id')),
+            dtype=np.int64
+        ).reshape(-1, 2)
+        metrics.count_query('product_views', len(views))
+        view_matrix = sparse.csr_matrix(self._to_entries(views, 0.5, user_ids, product_ids), shape=shape)
+        
+        matrix = purchase_matrix + view_matrix
+        matrix.sum_duplicates()
+        return matrix, user_ids, product_ids
+
+    @staticmethod
+    def _to_entries(pairs, weight, user_ids, product_ids):
+        """Map (user_id, product_id) rows to the (data, (row, column)) entries of a sparse matrix.
 
+        The ID lists are read in separate queries, so users or products
+        created in between are skipped rather than mapped to a neighbour's
+        row or past the end.
+        """
+        rows = np.searchsorted(user_ids, pairs[:, 0])
+        columns = np.searchsorted(product_ids, pairs[:, 1])
+        known = (
+            (rows < len(user_ids)) & (columns < len(product_ids))
+            & (user_ids[np.minimum(rows, len(user_ids) - 1)] == pairs[:, 0])
+            & (product_ids[np.minimum(columns, len(product_ids) - 1)] == pairs[:, 1])
+        ) if len(user_ids) and len(product_ids) else np.zeros(len(pairs), dtype=bool)
+        rows, columns = rows[known], columns[known]
+        return np.full(len(rows), weight), (rows, columns)
+
+    @staticmethod
+    def _user_index(user_ids, user_id):
+        """Row of user_id in the interaction matrix"""
+        user_idx = np.searchsorted(user_ids, user_id)
+        if user_idx >= len(user_ids) or user_ids[user_idx] != user_id:
+            raise User.DoesNotExist(f"User {user_id} does not exist")
+        return int(user_idx)
+
+    @metrics.timed('recommender_collaborative')
     def collaborative_filtering(self, user_id, n_recommendations=5):
-        """Generate recommendations using collaborative filtering"""
-        matrix, users, products = self.get_user_product_matrix()
-        user_idx = list(users).index(User.objects.get(id=user_id))
+        """Generate recommendations using collaborative filtering.
+
+        Uses the precomputed item-item neighbour index when one has been
+        built with the build_similarity_index command, and falls back to
+        user-based filtering over the live interaction matrix otherwise.
+        """
+        index = get_item_index(settings.RECOMMENDER_INDEX_DIR, settings.RECOMMENDER_INDEX_CHECK_INTERVAL)
+        if index is None:
+            return self.user_based_filtering(user_id, n_recommendations)
+        
+        scored = index.recommend(self.get_user_history(user_id), n_recommendations)
+        products = Product.objects.in_bulk([product_id for product_id, _ in scored])
+        return [(products[product_id], score) for product_id, score in scored if product_id in products]
+
+    def get_user_history(self, user_id):
+        """Map each product the user interacted with to its interaction weight"""
+        history = {}
+        # Purchases count once per product, each view adds 0.5
+        for product_id in PurchaseHistory.objects.filter(user_id=user_id).values_list('product_id', flat=True).distinct():
+            history[product_id] = 1.0
+        for product_id in ProductView.objects.filter(user_id=user_id).values_list('product_id', flat=True):
+            history[product_id] = history.get(product_id, 0.0) + 0.5
+        return history
+
+    def user_based_filtering(self, user_id, n_recommendations=5):
+        """Generate recommendations from the users most similar to this one"""
+        matrix, user_ids, product_ids = self.get_user_product_matrix()
+        user_idx = self._user_index(user_ids, user_id)
         
-        # Calculate user similarity
-        user_similarity = cosine_similarity(matrix)
+        # Calculate similarity between this user and every other user
+        user_similarity = cosine_similarity(matrix[user_idx], matrix)[0]
         
         # Get similar users
-        similar_users = np.argsort(user_similarity[user_idx])[::-1][1:6]
+        similar_users = [idx for idx in np.argsort(user_similarity)[::-1] if idx != user_idx][:5]
         
         # Get products liked by similar users
-        recommendations = []
+        seen = set(matrix[user_idx].indices)
+        scored = []
         for similar_user in similar_users:
-            liked_products = np.where(matrix[similar_user] > 0)[0]
-            for product_idx in liked_products:
-                if matrix[user_idx, product_idx] == 0:  # Not already interacted with
-                    product = products[product_idx]
-                    score = user_similarity[user_idx, similar_user]
-                    recommendations.append((product, score))
+            for product_idx in matrix[similar_user].indices:
+                if product_idx not in seen:  # Not already interacted with
+                    scored.append((int(product_ids[product_idx]), user_similarity[similar_user]))
         
         # Sort by score and return top n
-        recommendations.sort(key=lambda x: x[1], reverse=True)
-        return recommendations[:n_recommendations]
+        scored.sort(key=lambda x: x[1], reverse=True)
+        scored = scored[:n_recommendations]
+        products = Product.objects.in_bulk([product_id for product_id, _ in scored])
+        return [(products[product_id], score) for product_id, score in scored if product_id in products]
 
+    @metrics.timed('recommender_content_based')
     def content_based_filtering(self, user_id, n_recommendations=5):
         """Generate recommendations using content-based filtering"""
         user = User.objects.get(id=user_id)
@@ -67,33 +145,23 @@ class Recommender:
             # If no preferences, return empty list
             return []
         
-        # Get product descriptions
-        products = Product.objects.all()
-        descriptions = [f"{p.name} {p.description} {p.category}" for p in products]
-        
-        # Create TF-IDF matrix
-        tfidf_matrix = self.vectorizer.fit_transform(descriptions)
+        # Get user's previously viewed products
+        viewed_products = set(ProductView.objects.filter(user=user).values_list('product_id', flat=True))
         
-        # Calculate similarity between products
-        product_similarity = cosine_similarity(tfidf_matrix)
+        # Look up the neighbours of every viewed product in the cached model
+        neighbours = content_models.get().similar(viewed_products, 5)
         
-        # Get user's previously viewed products
-        viewed_products = ProductView.objects.filter(user=user).values_list('product_id', flat=True)
-        
-        recommendations = []
-        for viewed_id in viewed_products:
-            product_idx = list(products).index(Product.objects.get(id=viewed_id))
-            similar_products = np.argsort(product_similarity[product_idx])[::-1][1:6]
-            
-            for similar_idx in similar_products:
-                product = products[similar_idx]
-                if product.id not in viewed_products:
-                    score = product_similarity[product_idx, similar_idx]
-                    recommendations.append((product, score))
+        scored = []
+        for similar in neighbours.values():
+            for product_id, score in similar:
+                if product_id not in viewed_products:
+                    scored.append((product_id, score))
         
         # Sort by score and return top n
-        recommendations.sort(key=lambda x: x[1], reverse=True)
-        return recommendations[:n_recommendations]
+        scored.sort(key=lambda x: x[1], reverse=True)
+        scored = scored[:n_recommendations]
+        products = Product.objects.in_bulk([product_id for product_id, _ in scored])
+        return [(products[product_id], score) for product_id, score in scored if product_id in products]
 
     def generate_recommendations(self, user_id, n_recommendations=5):
         """Generate hybrid recommendations"""
@@ -118,4 +186,20 @@ class Recommender:
         
         # Sort by score and return top n
         recommendations = sorted(all_recs.values(), key=lambda x: x[1], reverse=True)
-        return recommendations[:n_recommendations] 
\ No newline at end of file
+        return recommendations[:n_recommendations]
+
+    def get_recommendations(self, user_id, n_recommendations=5):
+        """Serve precomputed recommendations, computing them online if none are stored"""
+        cutoff = timezone.now() - timedelta(seconds=settings.RECOMMENDER_PRECOMPUTED_MAX_AGE)
+        stored = (
+            Recommendation.objects
+            .filter(user_id=user_id, created_at__gte=cutoff)
+            .select_related('product')
+            .order_by('-score')[:n_recommendations]
+        )
+        with metrics.stage('recommender_precomputed_read'):
+            recommendations = [(rec.product, rec.score) for rec in stored]
+        metrics.count_query('precomputed_recommendations', len(recommendations))
+        if recommendations:
+            return recommendations
+        return self.generate_recommendations(user_id, n_recommendations)
@@ -0,0 +1,10 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from products.models import Product
+from .recommender import content_models
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_content_model(sender, **kwargs):
+    """Refit the content model after the product catalog changes"""
+    content_models.invalidate()
@@ -0,0 +1,139 @@
+import json
+import os
+import threading
+import time
+
+import numpy as np
+from sklearn.preprocessing import normalize
+
+from ml.versions import META_FILE, current_version, new_version, publish_version
+
+# Files making up one version of the item neighbor index
+NEIGHBORS_FILE = 'neighbors.npy'
+SCORES_FILE = 'scores.npy'
+PRODUCT_IDS_FILE = 'product_ids.npy'
+
+
+def build_item_neighbors(matrix, k, chunk_size=1024):
+    """Compute the top-k cosine neighbours of every column of a user-item matrix.
+
+    Returns ``(neighbors, scores)`` arrays of shape (n_items, k); neighbours
+    are column indices ordered by decreasing similarity, padded with -1
+    (score 0) when an item has fewer than k co-interacted items.
+    """
+    items = normalize(matrix.T.tocsr().astype(np.float32), norm='l2', axis=1)
+    items_t = items.T.tocsc()
+    n_items = items.shape[0]
+
+    neighbors = np.full((n_items, k), -1, dtype=np.int32)
+    scores = np.zeros((n_items, k), dtype=np.float32)
+
+    for start in range(0, n_items, chunk_size):
+        block = (items[start:start + chunk_size] @ items_t).tocsr()
+        for offset in range(block.shape[0]):
+            item = start + offset
+            lo, hi = block.indptr[offset], block.indptr[offset + 1]
+            cols = block.indices[lo:hi]
+            vals = block.data[lo:hi]
+
+            keep = (cols != item) & (vals > 0)
+            cols, vals = cols[keep], vals[keep]
+            if len(vals) > k:
+                top = np.argpartition(-vals, k - 1)[:k]
+                cols, vals = cols[top], vals[top]
+
+            order = np.lexsort((cols, -vals))
+            neighbors[item, :len(order)] = cols[order]
+            scores[item, :len(order)] = vals[order]
+
+    return neighbors, scores
+
+
+def save_item_index(directory, product_ids, neighbors, scores, keep=2):
+    """Write a new index version under directory and make it current.
+
+    Only the newest ``keep`` versions are kept on disk; workers that still
+    map an older version keep reading it until they notice the switch.
+    """
+    version, version_dir = new_version(directory)
+
+    np.save(os.path.join(version_dir, PRODUCT_IDS_FILE), np.asarray(product_ids, dtype=np.int64))
+    np.save(os.path.join(version_dir, NEIGHBORS_FILE), neighbors.astype(np.int32, copy=False))
+    np.save(os.path.join(version_dir, SCORES_FILE), scores.astype(np.float32, copy=False))
+    with open(os.path.join(version_dir, META_FILE), 'w') as f:
+        json.dump({'version': version, 'k': int(neighbors.shape[1]), 'items': int(neighbors.shape[0])}, f)
+
+    publish_version(directory, version, keep)
+    return version
+
+
+class ItemNeighborIndex:
+    """Memory-mapped item-item top-K neighbour lists"""
+
+    def __init__(self, version_dir):
+        self.product_ids = np.load(os.path.join(version_dir, PRODUCT_IDS_FILE), mmap_mode='r')
+        self.neighbors = np.load(os.path.join(version_dir, NEIGHBORS_FILE), mmap_mode='r')
+        self.scores = np.load(os.path.join(version_dir, SCORES_FILE), mmap_mode='r')
+        self.version = os.path.basename(version_dir)
+
+    def recommend(self, history, n_recommendations=5):
+        """Aggregate the neighbours of a user's history.
+
+        ``history`` maps product IDs to interaction weights. Returns up to
+        n_recommendations ``(product_id, score)`` pairs for products not in
+        the history, scored by the weighted mean similarity to it.
+        """
+        if not history or len(self.product_ids) == 0:
+            return []
+        history_ids = np.fromiter(history.keys(), dtype=np.int64, count=len(history))
+        weights = np.fromiter(history.values(), dtype=np.float32, count=len(history))
+
+        # Products created after the index was built are skipped
+        rows = np.minimum(np.searchsorted(self.product_ids, history_ids), len(self.product_ids) - 1)
+        known = self.product_ids[rows] == history_ids
+        rows, weights = rows[known], weights[known]
+        if len(rows) == 0:
+            return []
+
+        neighbors = self.neighbors[rows]
+        contributions = self.scores[rows] * weights[:, None]
+        valid = neighbors >= 0
+        candidates, inverse = np.unique(neighbors[valid], return_inverse=True)
+        totals = np.zeros(len(candidates), dtype=np.float32)
+        np.add.at(totals, inverse, contributions[valid])
+        totals /= weights.sum()
+
+        # Drop products the user already interacted with
+        fresh = ~np.isin(candidates, rows)
+        candidates, totals = candidates[fresh], totals[fresh]
+
+        top = np.lexsort((candidates, -totals))[:n_recommendations]
+        return [(int(self.product_ids[candidates[i]]), float(totals[i])) for i in top]
+
+
+_lock = threading.Lock()
+_index = None
+_checked_at = None
+
+
+def get_item_index(directory, check_interval=60.0):
+    """Return the current index under directory, or None if none was built.
+
+    The CURRENT pointer is re-read at most every check_interval seconds so
+    a rebuilt index is picked up without restarting the worker.
+    """
+    global _index, _checked_at
+    now = time.monotonic()
+    if _checked_at is not None and now - _checked_at < check_interval:
+        return _index
+
+    with _lock:
+        _checked_at = now
+        version = current_version(directory)
+        if version is None:
+            _index = None
+            return None
+
+        if _index is None or _index.version != version:
+            _index = ItemNeighborIndex(os.path.join(directory, version))
+        return _index
@@ -0,0 +1,40 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from products.models import Product, PurchaseHistory, Wishlist
+
+
+class DashboardQueryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            email='shopper@example.com', username='shopper', password='secret'
+        )
+        cls.products = [
+            Product.objects.create(name=f'P{i}', description='A product', price=10 + i, category='Books')
+            for i in range(8)
+        ]
+        for product in cls.products[:6]:
+            Wishlist.objects.create(user=cls.user, product=product)
+            PurchaseHistory.objects.create(user=cls.user, product=product)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_dashboard_query_count(self):
+        recommendations = [
+            {'Product_ID': product.name, 'Similarity_Score': 0.5, 'Final_Score': 0.5}
+            for product in self.products[:5]
+        ]
+        # Session, user, orders, wishlist with its products, recommended products
+        with mock.patch('users.views.get_top_recommendations', return_value=recommendations):
+            with self.assertNumQueries(5):
+                response = self.client.get(reverse('dashboard'), secure=True)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['orders']), 5)
+        self.assertEqual(len(response.context['wishlist_items']), 6)
+        self.assertEqual(len(response.context['recommended_products']), 5)
@@ -34,24 +34,26 @@ def user_login(request):
 @login_required
 def dashboard(request):
     orders = PurchaseHistory.objects.filter(user=request.user).order_by('-purchase_date')[:5]
-    wishlist_items = Wishlist.objects.filter(user=request.user)
+    wishlist_items = Wishlist.objects.filter(user=request.user).select_related('product')
     
     # Get recommendations for the current user
     recommendations = get_top_recommendations(str(request.user.id), top_n=5)
     
-    # Get product details for recommendations
-    recommended_products = []
-    for rec in recommendations:
-        try:
-            # Use the product name to look up the product instead of ID
-            product = Product.objects.get(name=rec['Product_ID'])
-            recommended_products.append({
-                'product': product,
-                'similarity_score': rec['Similarity_Score'],
-                'final_score': rec['Final_Score']
-            })
-        except Product.DoesNotExist:
-            continue
+    # Get product details for all recommendations in one query, using the
+    # product name to look up the product instead of ID
+    products = {}
+    for product in Product.objects.filter(name__in=[rec['Product_ID'] for rec in recommendations]).order_by('id'):
+        products.setdefault(product.name, product)
+    
+    recommended_products = [
+        {
+            'product': products[rec['Product_ID']],
+            'similarity_score': rec['Similarity_Score'],
+            'final_score': rec['Final_Score']
+        }
+        for rec in recommendations
+        if rec['Product_ID'] in products
+    ]
     
     context = {
         'orders': orders,